@@ -1,4 +1,5 @@
 import os
+import shutil
 
 PROJECT_DIRECTORY = os.path.realpath(os.path.curdir)
 
@@ -7,6 +8,10 @@ def remove_file(filepath):
     os.remove(os.path.join(PROJECT_DIRECTORY, filepath))
 
 
+def remove_dir(dirpath):
+    shutil.rmtree(os.path.join(PROJECT_DIRECTORY, dirpath))
+
+
 if __name__ == "__main__":
 
     if "{{ cookiecutter.select_license }}" == "None":
@@ -14,3 +19,31 @@ if __name__ == "__main__":
 
     if "{{ cookiecutter.use_azure_ci }}" == "n":
         remove_file("azure-pipelines.yml")
+
+    if "{{ cookiecutter.use_benchmarks }}" == "n":
+        remove_dir("benchmarks")
+        remove_file("tests/test_benchmarks.py")
+
+    if "{{ cookiecutter.compiler_backend }}" != "cython":
+        for filepath in [
+            "{{ cookiecutter.project_slug }}/_speedups.pyx",
+            "{{ cookiecutter.project_slug }}/_speedups_py.py",
+            "{{ cookiecutter.project_slug }}/speedups.py",
+            "tests/test_speedups.py",
+        ]:
+            remove_file(filepath)
+        if "{{ cookiecutter.use_benchmarks }}" == "y":
+            remove_file("benchmarks/bench_speedups.py")
+
+    if "{{ cookiecutter.compiler_backend }}" != "mypyc":
+        for filepath in [
+            "{{ cookiecutter.project_slug }}/stats.py",
+            "tests/test_compiled.py",
+            "tests/test_stats.py",
+        ]:
+            remove_file(filepath)
+        if "{{ cookiecutter.use_benchmarks }}" == "y":
+            remove_file("benchmarks/bench_stats.py")
+
+    if "{{ cookiecutter.use_lazy_imports }}" == "n":
+        remove_file("tests/test_exports.py")
@@ -13,3 +13,28 @@ if not re.match(MODULE_REGEX, module_name):
 
     # Exit to cancel project
     sys.exit(1)
+
+# use_cython=y, kept from before compiler_backend, selects cython
+if (
+    "{{ cookiecutter.use_cython }}" == "y"
+    and "{{ cookiecutter.compiler_backend }}" != "cython"
+):
+    print(
+        "ERROR: use_cython=y contradicts "
+        "compiler_backend={{ cookiecutter.compiler_backend }}"
+    )
+
+    # Exit to cancel project
+    sys.exit(1)
+
+if (
+    "{{ cookiecutter.use_openmp }}" == "y"
+    and "{{ cookiecutter.compiler_backend }}" != "cython"
+):
+    print(
+        "ERROR: use_openmp requires compiler_backend=cython, "
+        "got compiler_backend={{ cookiecutter.compiler_backend }}"
+    )
+
+    # Exit to cancel project
+    sys.exit(1)
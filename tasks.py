@@ -1,17 +1,188 @@
 """Development tasks for the cookiecutter template project"""
 
+import contextlib
+import csv
+import io
+import json
+import os
 import platform
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from invoke import task
+from invoke import Exit, task
 
 ROOT_DIR = Path(__file__).parent
+TEMPLATE_FILE = ROOT_DIR.joinpath('cookiecutter.json')
+TEMPLATE_DIR = ROOT_DIR.joinpath('{{cookiecutter.project_slug}}')
 DOCS_DIR = ROOT_DIR.joinpath('docs')
 DOCS_BUILD_DIR = DOCS_DIR.joinpath('_build')
 DOCS_INDEX = DOCS_BUILD_DIR.joinpath('index.html')
 TEST_DIR = ROOT_DIR.joinpath('tests')
 HOOKS_DIR = ROOT_DIR.joinpath('hooks')
+PRE_GEN_HOOK = HOOKS_DIR.joinpath('pre_gen_project.py')
 PYTHON_DIRS = [str(HOOKS_DIR), str(TEST_DIR)]
 
+BakeReport = namedtuple(
+    'BakeReport', ['row', 'project_dir', 'seconds', 'error']
+)
+
+
+def read_contexts(path):
+    """
+    Read the contexts to bake from a JSON list of objects or from a CSV file
+    with a header of option names
+    :param path: String, path of the .json or .csv file.
+    """
+    path = Path(path)
+    with path.open(newline='', encoding='utf-8') as file:
+        if path.suffix == '.json':
+            contexts = json.load(file)
+        elif path.suffix == '.csv':
+            contexts = list(csv.DictReader(file))
+        else:
+            raise ValueError("Unsupported contexts file: {}".format(path))
+    if not isinstance(contexts, list):
+        raise ValueError("{} must contain a list of contexts".format(path))
+    return contexts
+
+
+def make_context(extra_context, output_dir):
+    """
+    Resolve the full cookiecutter context without prompting, as the
+    cookiecutter command would do
+    """
+    from cookiecutter.generate import generate_context
+    from cookiecutter.prompt import prompt_for_config
+
+    context = generate_context(
+        context_file=str(TEMPLATE_FILE), extra_context=extra_context
+    )
+    context['cookiecutter'] = prompt_for_config(context, no_input=True)
+    context['cookiecutter']['_template'] = str(ROOT_DIR)
+    context['cookiecutter']['_output_dir'] = os.path.abspath(output_dir)
+    context['cookiecutter']['_repo_dir'] = str(ROOT_DIR)
+    return context
+
+
+def validate_contexts(contexts):
+    """
+    Run the pre_gen_project hook in-process against every context, and reject
+    contexts sharing a project_slug, as they would be baked into the same
+    directory. Returns the error messages keyed by row index
+    """
+    from cookiecutter.utils import create_env_with_context
+
+    source = PRE_GEN_HOOK.read_text(encoding='utf-8')
+    errors = {}
+    slug_rows = {}
+    for row, extra_context in enumerate(contexts):
+        context = make_context(extra_context, '.')
+        slug = context['cookiecutter']['project_slug']
+        slug_rows.setdefault(slug, []).append(row)
+        env = create_env_with_context(context)
+        script = env.from_string(source).render(**context)
+        output = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(output):
+                code = compile(script, str(PRE_GEN_HOOK), 'exec')
+                exec(code, {'__name__': '__main__'})
+        except SystemExit as e:
+            if e.code:
+                errors[row] = output.getvalue().strip() or repr(e)
+    for slug, rows in slug_rows.items():
+        if len(rows) > 1:
+            for row in rows:
+                errors.setdefault(row, (
+                    "ERROR: The project slug ({}) is shared by rows {}".format(
+                        slug, ", ".join(str(other) for other in rows)
+                    )
+                ))
+    return errors
+
+
+def precompile_templates(cache_dir):
+    """
+    Compile every template file once into a Jinja bytecode cache, shared by
+    the processes baking the projects
+    """
+    from binaryornot.check import is_binary
+    from cookiecutter.utils import create_env_with_context, work_in
+    from jinja2 import FileSystemBytecodeCache, FileSystemLoader
+
+    context = make_context({}, '.')
+    context['cookiecutter']['_jinja2_env_vars'] = {
+        'bytecode_cache': FileSystemBytecodeCache(cache_dir),
+    }
+    env = create_env_with_context(context)
+    # Same loader and template names as cookiecutter.generate.generate_files
+    with work_in(str(TEMPLATE_DIR)):
+        env.loader = FileSystemLoader(['.', '../templates'])
+        for root, _, files in os.walk('.'):
+            for name in files:
+                infile = os.path.normpath(os.path.join(root, name))
+                if not is_binary(infile):
+                    env.get_template(Path(infile).as_posix())
+
+
+def bake_one(row, extra_context, output_dir, cache_dir):
+    """
+    Bake a project reusing the precompiled templates. The pre_gen_project
+    hook is skipped, as validate_contexts already ran it
+    """
+    from cookiecutter.generate import generate_files
+    from cookiecutter.hooks import run_hook
+    from cookiecutter.utils import work_in
+    from jinja2 import FileSystemBytecodeCache
+
+    start = time.perf_counter()
+    try:
+        context = make_context(extra_context, output_dir)
+        context['cookiecutter']['_jinja2_env_vars'] = {
+            'bytecode_cache': FileSystemBytecodeCache(cache_dir),
+        }
+        project_dir = generate_files(
+            repo_dir=str(ROOT_DIR),
+            context=context,
+            output_dir=output_dir,
+            accept_hooks=False,
+        )
+        with work_in(str(ROOT_DIR)):
+            run_hook('post_gen_project', project_dir, context)
+    except Exception as e:
+        return BakeReport(row, None, time.perf_counter() - start, repr(e))
+    return BakeReport(row, project_dir, time.perf_counter() - start, None)
+
+
+def bake_batch(contexts, output_dir, workers=None):
+    """
+    Bake every context across a process pool, after validating all of them
+    up front. Returns one BakeReport per context, in order
+    :param contexts: List of dicts, values overriding cookiecutter.json.
+    :param output_dir: String, where the projects are generated.
+    :param workers: Int, processes baking the projects (default: CPU count).
+    """
+    errors = validate_contexts(contexts)
+    if errors:
+        return [
+            BakeReport(row, None, 0.0, errors.get(row, "Not baked"))
+            for row in range(len(contexts))
+        ]
+
+    os.makedirs(output_dir, exist_ok=True)
+    workers = min(workers or os.cpu_count() or 1, max(len(contexts), 1))
+    with tempfile.TemporaryDirectory() as cache_dir:
+        precompile_templates(cache_dir)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    bake_one, row, extra_context, output_dir, cache_dir
+                )
+                for row, extra_context in enumerate(contexts)
+            ]
+            return [future.result() for future in futures]
+
 
 @task(help={'check': "Checks if source is formatted without applying changes"})
 def format(c, check=False):
@@ -68,13 +239,43 @@ def lint(c):
     c.run("pylint {}".format(python_dirs_string))
 
 
-@task
-def test(c):
+@task(help={
+    'slow': "Include the slow tests running pytest inside baked projects",
+    'snapshot_update': "Rewrite the golden snapshots of the baked trees",
+})
+def test(c, slow=False, snapshot_update=False):
     """
     Run tests
     """
     pty = platform.system() == 'Linux'
-    c.run("pytest", pty=pty)
+    options = [
+        "--slow" if slow else "",
+        "--snapshot-update" if snapshot_update else "",
+    ]
+    c.run("pytest {}".format(" ".join(options)), pty=pty)
+
+
+@task(help={
+    'contexts': "CSV or JSON file with one context per row",
+    'output_dir': "Where the projects are generated",
+    'workers': "Processes baking the projects (default: CPU count)",
+})
+def bake_matrix(c, contexts, output_dir=".", workers=None):
+    """
+    Bake one project per context of a CSV/JSON file
+    """
+    start = time.perf_counter()
+    workers = int(workers) if workers else None
+    reports = bake_batch(read_contexts(contexts), output_dir, workers)
+    for report in reports:
+        outcome = report.project_dir or "FAILED: {}".format(report.error)
+        print("{:>4}  {:8.3f}s  {}".format(report.row, report.seconds, outcome))
+    failed = [report for report in reports if report.error]
+    print("Baked {} of {} projects in {:.3f}s".format(
+        len(reports) - len(failed), len(reports), time.perf_counter() - start
+    ))
+    if failed:
+        raise Exit(code=1)
 
 
 @task
@@ -0,0 +1,234 @@
+"""Helpers to bake the template once per distinct context"""
+
+import argparse
+import compileall
+import hashlib
+import io
+import itertools
+import json
+import os
+import stat
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from cookiecutter.generate import generate_context
+from cookiecutter.main import cookiecutter
+from cookiecutter.prompt import prompt_for_config
+
+# Options only meaningful together with others: the pre_gen_project hook
+# rejects the combinations enabling them without their requirements
+OPTION_REQUIREMENTS = {
+    "use_openmp": {"compiler_backend": "cython"},
+}
+# Options kept for the answers of older versions, which select the value
+# of a newer option by default
+DEPRECATED_OPTIONS = {"use_cython"}
+
+TEMPLATE_ENTRIES = [
+    "cookiecutter.json",
+    "hooks",
+    "{{cookiecutter.project_slug}}",
+]
+
+
+def template_hash(template_dir):
+    """
+    Hash the content of every file the template is rendered from
+    :param template_dir: String, path of the cookiecutter template.
+    """
+    digest = hashlib.sha256()
+    for entry in TEMPLATE_ENTRIES:
+        path = Path(template_dir, entry)
+        files = [path] if path.is_file() else sorted(path.rglob("*"))
+        for file in files:
+            if not file.is_file() or "__pycache__" in file.parts:
+                continue
+            digest.update(file.relative_to(template_dir).as_posix().encode())
+            digest.update(b"\0")
+            digest.update(file.read_bytes())
+            digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def resolve_context(template_dir, extra_context=None):
+    """
+    Render the context the template would be baked with, without baking it
+    :param template_dir: String, path of the cookiecutter template.
+    :param extra_context: Dict, values overriding the cookiecutter.json ones.
+    """
+    context = generate_context(
+        context_file=os.path.join(template_dir, "cookiecutter.json"),
+        extra_context=extra_context,
+    )
+    return prompt_for_config(context, no_input=True)
+
+
+def context_hash(context):
+    """Hash a resolved context independently of its key order"""
+    encoded = json.dumps(context, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def make_read_only(dirpath):
+    """
+    Drop the write permission from every file of a baked project, so that
+    tests sharing it cannot change what the others see. Directories stay
+    writable for tools storing caches (e.g. __pycache__, .pytest_cache).
+    """
+    write_bits = stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH
+    for root, _, files in os.walk(dirpath):
+        for name in files:
+            path = os.path.join(root, name)
+            os.chmod(path, stat.S_IMODE(os.stat(path).st_mode) & ~write_bits)
+
+
+class BakeCache:
+    """
+    Bake each distinct context exactly once, keyed by the content hash of
+    the template plus the hash of the resolved context.
+
+    Results are shared between tests and must be treated as read-only:
+    tests that need to modify a project have to bake a private copy.
+    """
+
+    def __init__(self, cookies, template_dir):
+        self._cookies = cookies
+        self._template_dir = template_dir
+        self._template_hash = template_hash(template_dir)
+        self._results = {}
+
+    def key(self, extra_context=None):
+        """Return the cache key of the project baked with extra_context"""
+        context = resolve_context(self._template_dir, extra_context)
+        digest = hashlib.sha256(self._template_hash.encode())
+        digest.update(context_hash(context).encode())
+        return digest.hexdigest()
+
+    def bake(self, extra_context=None):
+        """Return the cached bake result, baking it on the first request"""
+        key = self.key(extra_context)
+        if key not in self._results:
+            result = self._cookies.bake(extra_context=extra_context)
+            if result.exception is None:
+                make_read_only(str(result.project_path))
+            self._results[key] = result
+        return self._results[key]
+
+    def __len__(self):
+        return len(self._results)
+
+
+def option_matrix(template_dir):
+    """
+    Build every combination of the template options: choice lists and y/n
+    flags of cookiecutter.json are expanded, other values keep the default.
+    Flags enabled without their OPTION_REQUIREMENTS, and the
+    DEPRECATED_OPTIONS, are left out
+    :param template_dir: String, path of the cookiecutter template.
+    """
+    with open(os.path.join(template_dir, "cookiecutter.json")) as file:
+        context = json.load(file)
+
+    options = {}
+    for name, value in context.items():
+        if name.startswith("_") or name in DEPRECATED_OPTIONS:
+            continue
+        if isinstance(value, list):
+            # Without the defaults rendered from other options
+            options[name] = [v for v in value if "{{" not in v]
+        elif value in ("y", "n"):
+            options[name] = ["y", "n"]
+
+    names = sorted(options)
+    combinations = [
+        dict(zip(names, values))
+        for values in itertools.product(*(options[name] for name in names))
+    ]
+    return [
+        combination
+        for combination in combinations
+        if all(
+            combination.get(name) != "y"
+            or all(combination.get(k) == v for k, v in requirements.items())
+            for name, requirements in OPTION_REQUIREMENTS.items()
+        )
+    ]
+
+
+def parse_shard(value):
+    """Parse a 'i/N' shard specification, with 1 <= i <= N"""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "shard must be in the form i/N, got {!r}".format(value)
+        )
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(
+            "shard index must be between 1 and {}, got {}".format(count, index)
+        )
+    return index, count
+
+
+def shard(items, index, count):
+    """Return the index-th of count interleaved slices of items"""
+    return items[index - 1 :: count]
+
+
+def context_id(context):
+    """Readable test id of a combination of options"""
+    return "-".join(
+        "{}={}".format(name, value) for name, value in sorted(context.items())
+    ).replace(" ", "_")
+
+
+MatrixBake = namedtuple("MatrixBake", ["context", "project_dir", "error"])
+
+
+def bake_and_validate(template_dir, output_dir, config_file, extra_context):
+    """
+    Bake a combination of options and byte-compile every generated Python
+    file. Meant to run in a worker process: cookiecutter changes the
+    working directory while running the hooks.
+    """
+    try:
+        project_dir = cookiecutter(
+            template_dir,
+            no_input=True,
+            extra_context=extra_context,
+            output_dir=output_dir,
+            config_file=config_file,
+        )
+    except (Exception, SystemExit) as e:
+        return MatrixBake(extra_context, None, repr(e))
+
+    output = io.StringIO()
+    with redirect_stdout(output):
+        compiled = compileall.compile_dir(project_dir, quiet=1)
+    error = None if compiled else output.getvalue()
+    return MatrixBake(extra_context, project_dir, error)
+
+
+def bake_matrix(template_dir, output_dir, config_file, contexts, workers=None):
+    """
+    Bake and validate contexts across a process pool, returning the
+    MatrixBake results keyed by the context hash
+    """
+    if not contexts:
+        return {}
+    workers = min(workers or os.cpu_count() or 1, len(contexts))
+    output_dirs = [
+        os.path.join(output_dir, "combo{:03d}".format(i))
+        for i in range(len(contexts))
+    ]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            bake_and_validate,
+            itertools.repeat(template_dir),
+            output_dirs,
+            itertools.repeat(config_file),
+            contexts,
+        )
+        return {context_hash(bake.context): bake for bake in results}
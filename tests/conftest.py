@@ -0,0 +1,82 @@
+import pytest
+
+from .baking import (
+    BakeCache,
+    bake_matrix,
+    context_id,
+    option_matrix,
+    parse_shard,
+    shard,
+)
+from .manifest import prune_texts
+
+
+def pytest_addoption(parser):
+    parser.addoption("--slow", action="store_true", help="include slow tests")
+    group = parser.getgroup("cookies")
+    group.addoption(
+        "--shard",
+        action="store",
+        default="1/1",
+        type=parse_shard,
+        help="bake only the i-th of N slices of the option matrix (i/N)",
+    )
+    group.addoption(
+        "--bake-workers",
+        action="store",
+        default=None,
+        type=int,
+        help="processes baking the option matrix (default: CPU count)",
+    )
+    group.addoption(
+        "--snapshot-update",
+        action="store_true",
+        default=False,
+        help="rewrite the golden snapshots of the baked trees",
+    )
+
+
+def pytest_runtest_setup(item):
+    def getopt(opt):
+        return item.config.getoption("--%s" % opt, False)
+
+    for opt in ["slow"]:
+        if opt in item.keywords and not getopt(opt):
+            pytest.skip("need --%s option to run" % opt)
+
+
+def pytest_sessionfinish(session):
+    if session.config.getoption("snapshot_update"):
+        prune_texts()
+
+
+def _matrix_shard(config):
+    contexts = option_matrix(config.option.template)
+    return shard(contexts, *config.getoption("shard"))
+
+
+def pytest_generate_tests(metafunc):
+    if "matrix_context" in metafunc.fixturenames:
+        contexts = _matrix_shard(metafunc.config)
+        metafunc.parametrize(
+            "matrix_context", contexts, ids=[context_id(c) for c in contexts]
+        )
+
+
+@pytest.fixture(scope="session")
+def bake_cache(request, cookies_session):
+    """Session-wide cache baking each distinct context only once"""
+    return BakeCache(cookies_session, request.config.option.template)
+
+
+@pytest.fixture(scope="session")
+def matrix_bakes(request, tmp_path_factory, _cookiecutter_config_file):
+    """Bake the current shard of the option matrix across a process pool"""
+    config = request.config
+    return bake_matrix(
+        config.option.template,
+        str(tmp_path_factory.mktemp("matrix")),
+        str(_cookiecutter_config_file),
+        _matrix_shard(config),
+        workers=config.getoption("bake_workers"),
+    )
@@ -0,0 +1,172 @@
+"""Compact manifests of baked trees, compared against golden snapshots"""
+
+import datetime
+import difflib
+import hashlib
+import json
+import os
+
+from jinja2 import Environment
+
+TEMPLATE_DIR_NAME = "{{cookiecutter.project_slug}}"
+SNAPSHOTS_DIR = os.path.join(os.path.dirname(__file__), "snapshots")
+# Normalised text of the templated files by content hash, shared by every
+# snapshot: most of them render the same way in many combinations
+TEXTS_PATH = os.path.join(SNAPSHOTS_DIR, "texts.json")
+IGNORED_DIRS = {"__pycache__", ".pytest_cache"}
+JINJA_MARKERS = ("{{", "{%", "{#")
+
+
+def templated_files(template_dir, context):
+    """
+    Return the baked relative paths of the files rendered through Jinja,
+    whose content depends on the context
+    :param template_dir: String, path of the cookiecutter template.
+    :param context: Dict, resolved cookiecutter context.
+    """
+    source_dir = os.path.join(template_dir, TEMPLATE_DIR_NAME)
+    environment = Environment()
+    paths = set()
+    for root, dirs, files in os.walk(source_dir):
+        dirs[:] = [d for d in dirs if d not in IGNORED_DIRS]
+        for name in files:
+            path = os.path.join(root, name)
+            with open(path, encoding="utf-8", errors="replace") as file:
+                content = file.read()
+            if not any(marker in content for marker in JINJA_MARKERS):
+                continue
+            relpath = os.path.relpath(path, source_dir).replace(os.sep, "/")
+            paths.add(
+                environment.from_string(relpath).render(cookiecutter=context)
+            )
+    return paths
+
+
+def normalise(text):
+    """Drop what changes between two bakes of the same context"""
+    year = str(datetime.date.today().year)
+    lines = [line.rstrip() for line in text.replace(year, "<YEAR>").split("\n")]
+    while lines and not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def build_manifest(project_dir, templated):
+    """
+    Describe a baked tree by path, size and content hash, keeping the
+    normalised text of the templated files to show minimal diffs
+    :param project_dir: String, path of the baked project.
+    :param templated: Set, relative paths of the templated files.
+    """
+    files = {}
+    for root, dirs, names in os.walk(project_dir):
+        dirs[:] = sorted(d for d in dirs if d not in IGNORED_DIRS)
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            relpath = os.path.relpath(path, project_dir).replace(os.sep, "/")
+            with open(path, "rb") as file:
+                content = file.read()
+            entry = {}
+            if relpath in templated:
+                lines = normalise(content.decode("utf-8"))
+                content = "\n".join(lines).encode("utf-8")
+                entry["text"] = lines
+            entry["size"] = len(content)
+            entry["sha256"] = hashlib.sha256(content).hexdigest()
+            files[relpath] = entry
+    return {"files": files}
+
+
+def snapshot_path(name):
+    return os.path.join(SNAPSHOTS_DIR, "{}.json".format(name))
+
+
+def _read_json(path, default=None):
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return default
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(data, file, indent=1, sort_keys=True)
+        file.write("\n")
+
+
+def load_snapshot(name):
+    """Return the stored manifest, or None when there is none yet"""
+    manifest = _read_json(snapshot_path(name))
+    if manifest is None:
+        return None
+    texts = _read_json(TEXTS_PATH, {})
+    for entry in manifest["files"].values():
+        if entry["sha256"] in texts:
+            entry["text"] = texts[entry["sha256"]]
+    return manifest
+
+
+def save_snapshot(name, manifest):
+    """
+    Store the path, size and hash of every file of a manifest, and the text
+    of its templated files once per content hash in TEXTS_PATH
+    """
+    texts = _read_json(TEXTS_PATH, {})
+    files = {}
+    for path, entry in manifest["files"].items():
+        files[path] = {"size": entry["size"], "sha256": entry["sha256"]}
+        if "text" in entry:
+            texts[entry["sha256"]] = entry["text"]
+    _write_json(snapshot_path(name), {"files": files})
+    _write_json(TEXTS_PATH, texts)
+
+
+def prune_texts():
+    """Drop the stored texts no snapshot refers to anymore"""
+    texts = _read_json(TEXTS_PATH, {})
+    used = set()
+    for name in os.listdir(SNAPSHOTS_DIR):
+        path = os.path.join(SNAPSHOTS_DIR, name)
+        if name.endswith(".json") and path != TEXTS_PATH:
+            used.update(
+                entry["sha256"] for entry in _read_json(path)["files"].values()
+            )
+    _write_json(TEXTS_PATH, {h: t for h, t in texts.items() if h in used})
+
+
+def diff_manifests(expected, actual):
+    """
+    Compare two manifests in a single pass, returning a list of readable
+    differences (empty when they match)
+    """
+    expected_files = expected["files"]
+    actual_files = actual["files"]
+    differences = []
+    for path in sorted(set(expected_files) | set(actual_files)):
+        old = expected_files.get(path)
+        new = actual_files.get(path)
+        if old is None:
+            differences.append("+ {} (unexpected file)".format(path))
+        elif new is None:
+            differences.append("- {} (missing file)".format(path))
+        elif old["sha256"] != new["sha256"]:
+            if "text" in old and "text" in new:
+                differences.extend(
+                    difflib.unified_diff(
+                        old["text"],
+                        new["text"],
+                        "snapshot/{}".format(path),
+                        "baked/{}".format(path),
+                        n=1,
+                        lineterm="",
+                    )
+                )
+            else:
+                differences.append(
+                    "~ {} (size {} -> {})".format(
+                        path, old["size"], new["size"]
+                    )
+                )
+    return differences
@@ -0,0 +1,126 @@
+"""Run the test suite of a baked project inside the current interpreter"""
+
+import importlib
+import os
+import sys
+from collections import namedtuple
+from contextlib import contextmanager
+
+import pytest
+
+TestReport = namedtuple(
+    "TestReport", ["nodeid", "when", "outcome", "duration", "longrepr"]
+)
+
+
+class PytestRun:
+    """Exit code and per-test reports of an in-process pytest session"""
+
+    def __init__(self, exit_code, reports):
+        self.exit_code = int(exit_code)
+        self.reports = reports
+
+    @property
+    def passed(self):
+        return [r for r in self.reports if r.outcome == "passed"]
+
+    @property
+    def failed(self):
+        return [r for r in self.reports if r.outcome == "failed"]
+
+    @property
+    def skipped(self):
+        return [r for r in self.reports if r.outcome == "skipped"]
+
+    def __repr__(self):
+        return "<PytestRun exit_code={} passed={} failed={} skipped={}>".format(
+            self.exit_code, len(self.passed), len(self.failed), len(self.skipped)
+        )
+
+
+class _ReportCollector:
+    """pytest plugin recording the outcome of every test phase"""
+
+    def __init__(self):
+        self.reports = []
+
+    def pytest_runtest_logreport(self, report):
+        # Setup and teardown only matter when they did not pass
+        if report.when != "call" and report.passed:
+            return
+        longrepr = str(report.longrepr) if report.longrepr else None
+        self.reports.append(
+            TestReport(
+                report.nodeid,
+                report.when,
+                report.outcome,
+                report.duration,
+                longrepr,
+            )
+        )
+
+
+def _top_level_names(dirpath):
+    """Names a baked project would import that may shadow ours (e.g. tests)"""
+    names = set()
+    for entry in os.listdir(dirpath):
+        path = os.path.join(dirpath, entry)
+        if os.path.isfile(os.path.join(path, "__init__.py")):
+            names.add(entry)
+        elif entry.endswith(".py"):
+            names.add(entry[:-3])
+    return names
+
+
+@contextmanager
+def isolated_interpreter(dirpath):
+    """
+    Snapshot the import state and working directory, hide the already
+    imported modules the project at dirpath would shadow, and restore
+    everything on exit
+    """
+    saved_cwd = os.getcwd()
+    saved_path = list(sys.path)
+    saved_meta_path = list(sys.meta_path)
+    saved_modules = dict(sys.modules)
+
+    shadowed = _top_level_names(dirpath)
+    for name in list(sys.modules):
+        if name.split(".")[0] in shadowed:
+            del sys.modules[name]
+    importlib.invalidate_caches()
+    try:
+        os.chdir(dirpath)
+        yield
+    finally:
+        os.chdir(saved_cwd)
+        sys.path[:] = saved_path
+        sys.meta_path[:] = saved_meta_path
+        for name in list(sys.modules):
+            if name not in saved_modules:
+                del sys.modules[name]
+        sys.modules.update(saved_modules)
+        importlib.invalidate_caches()
+
+
+def run_pytest(dirpath, *args):
+    """
+    Run pytest on the project at dirpath through pytest.main, without
+    starting a new interpreter
+    :param dirpath: String, path of the project whose tests are run.
+    :param args: Extra command line arguments for pytest.
+    """
+    collector = _ReportCollector()
+    options = [
+        "--rootdir",
+        dirpath,
+        # Baked projects are shared read-only: do not write .pytest_cache
+        "-p",
+        "no:cacheprovider",
+        "-q",
+    ]
+    with isolated_interpreter(dirpath):
+        exit_code = pytest.main(
+            options + list(args) + [dirpath], plugins=[collector]
+        )
+    return PytestRun(exit_code, collector.reports)
@@ -1,10 +1,25 @@
+import json
 import os
 import shlex
 import subprocess
+import sys
 from contextlib import contextmanager
 
+import pytest
 from cookiecutter.utils import rmtree
 
+from tasks import bake_batch
+
+from .baking import context_hash, context_id, resolve_context
+from .manifest import (
+    build_manifest,
+    diff_manifests,
+    load_snapshot,
+    save_snapshot,
+    templated_files,
+)
+from .runner import run_pytest
+
 
 @contextmanager
 def inside_dir(dirpath):
@@ -23,7 +38,8 @@ def inside_dir(dirpath):
 @contextmanager
 def bake_in_temp_dir(cookies, *args, **kwargs):
     """
-    Delete the temporal directory that is created when executing the tests
+    Delete the temporal directory that is created when executing the tests.
+    Use it instead of the bake_cache fixture when the project gets modified
     :param cookies: pytest_cookies.Cookies,
         cookie to be baked and its temporal files will be removed
     """
@@ -59,96 +75,399 @@ def project_info(result):
     return project_path, project_slug, project_dir
 
 
-def test_bake_with_defaults(cookies):
-    with bake_in_temp_dir(cookies) as result:
-        assert result.project.isdir()
-        assert result.exit_code == 0
-        assert result.exception is None
+def test_bake_cache_reuses_identical_contexts(bake_cache):
+    result = bake_cache.bake()
+    assert bake_cache.bake() is result
+    # Explicitly passing a default resolves to the same context
+    assert bake_cache.bake(extra_context={"full_name": "Your Name"}) is result
+    other = bake_cache.bake(extra_context={"full_name": "O'connor"})
+    assert other.project_path != result.project_path
 
-        found_toplevel_files = [f.basename for f in result.project.listdir()]
-        assert "setup.py" in found_toplevel_files
-        assert "python_boilerplate" in found_toplevel_files
-        assert "tests" in found_toplevel_files
+
+def test_run_pytest_reports_each_test(tmp_path):
+    tests_dir = tmp_path / "tests"
+    tests_dir.mkdir()
+    tests_dir.joinpath("__init__.py").touch()
+    tests_dir.joinpath("test_sample.py").write_text(
+        "def test_ok():\n    pass\n\n\ndef test_ko():\n    assert False\n"
+    )
+    own_tests = sys.modules["tests"]
+
+    run = run_pytest(str(tmp_path))
+    assert run.exit_code == 1
+    assert [r.nodeid for r in run.passed] == ["tests/test_sample.py::test_ok"]
+    assert [r.nodeid for r in run.failed] == ["tests/test_sample.py::test_ko"]
+    # The baked tests package must not leak into our own
+    assert sys.modules["tests"] is own_tests
+
+
+def test_bake_with_defaults(bake_cache):
+    result = bake_cache.bake()
+    assert result.project.isdir()
+    assert result.exit_code == 0
+    assert result.exception is None
+
+    found_toplevel_files = [f.basename for f in result.project.listdir()]
+    assert "setup.py" in found_toplevel_files
+    assert "python_boilerplate" in found_toplevel_files
+    assert "tests" in found_toplevel_files
 
 
-def test_bake_and_run_tests(cookies):
-    with bake_in_temp_dir(cookies) as result:
-        assert result.project.isdir()
-        run_inside_dir(["pytest"], str(result.project)) == 0
+@pytest.mark.slow
+def test_bake_and_run_tests(bake_cache):
+    result = bake_cache.bake()
+    assert result.project.isdir()
+    run = run_pytest(str(result.project_path))
+    assert run.exit_code == 0, run.failed
+    assert run.passed
 
 
-def test_bake_with_specialchars_and_run_tests(cookies):
+@pytest.mark.slow
+def test_bake_with_specialchars_and_run_tests(bake_cache):
     """Ensure that a `full_name` with double quotes does not break setup.py"""
-    with bake_in_temp_dir(
-        cookies, extra_context={"full_name": 'name "quote" name'}
-    ) as result:
-        assert result.project.isdir()
-        run_inside_dir(["pytest"], str(result.project)) == 0
+    result = bake_cache.bake(extra_context={"full_name": 'name "quote" name'})
+    assert result.project.isdir()
+    run = run_pytest(str(result.project_path))
+    assert run.exit_code == 0, run.failed
+    assert run.passed
 
 
-def test_bake_with_apostrophe_and_run_tests(cookies):
+@pytest.mark.slow
+def test_bake_with_apostrophe_and_run_tests(bake_cache):
     """Ensure that a `full_name` with apostrophes does not break setup.py"""
-    with bake_in_temp_dir(
-        cookies, extra_context={"full_name": "O'connor"}
-    ) as result:
-        assert result.project.isdir()
-        run_inside_dir(["pytest"], str(result.project)) == 0
+    result = bake_cache.bake(extra_context={"full_name": "O'connor"})
+    assert result.project.isdir()
+    run = run_pytest(str(result.project_path))
+    assert run.exit_code == 0, run.failed
+    assert run.passed
 
 
-def test_bake_selecting_license(cookies):
+def test_bake_selecting_license(bake_cache):
     license = "Apache Software License 2.0"
     target = "Licensed under the Apache License, Version 2.0"
-    with bake_in_temp_dir(
-        cookies, extra_context={"select_license": license}
-    ) as result:
-        assert target in result.project.join("LICENSE").read()
-        assert license in result.project.join("setup.py").read()
+    result = bake_cache.bake(extra_context={"select_license": license})
+    assert target in result.project.join("LICENSE").read()
+    assert license in result.project.join("setup.py").read()
 
 
-def test_bake_not_open_source(cookies):
-    with bake_in_temp_dir(
-        cookies, extra_context={"select_license": "None"}
-    ) as result:
-        found_toplevel_files = [f.basename for f in result.project.listdir()]
-        assert "setup.py" in found_toplevel_files
-        assert "LICENSE" not in found_toplevel_files
-        assert "License" not in result.project.join("README.rst").read()
+def test_bake_not_open_source(bake_cache):
+    result = bake_cache.bake(extra_context={"select_license": "None"})
+    found_toplevel_files = [f.basename for f in result.project.listdir()]
+    assert "setup.py" in found_toplevel_files
+    assert "LICENSE" not in found_toplevel_files
+    assert "License" not in result.project.join("README.rst").read()
 
 
-def test_using_pytest(cookies):
-    with bake_in_temp_dir(cookies) as result:
-        assert result.project.isdir()
-        # Test contents of test file
-        test_file_path = result.project.join(
-            "tests/test_python_boilerplate.py"
-        )
-        lines = test_file_path.readlines()
-        assert "import pytest" in "".join(lines)
-        # Test the test alias (which invokes pytest)
-        run_inside_dir(["pytest"], str(result.project)) == 0
+def test_bake_with_use_cython(bake_cache, capfd):
+    """use_cython=y, from before compiler_backend, selects cython"""
+    result = bake_cache.bake(extra_context={"use_cython": "y"})
+    assert result.exit_code == 0
+    package = result.project.join("python_boilerplate")
+    assert package.join("_speedups.pyx").isfile()
+
+    result = bake_cache.bake(
+        extra_context={"use_cython": "y", "compiler_backend": "mypyc"}
+    )
+    assert result.exit_code != 0
+    assert "use_cython=y contradicts" in capfd.readouterr().out
+
 
+@pytest.mark.parametrize("backend", ["none", "mypyc"])
+def test_bake_openmp_without_cython_fails(bake_cache, capfd, backend):
+    result = bake_cache.bake(
+        extra_context={"use_openmp": "y", "compiler_backend": backend}
+    )
+    assert result.exit_code != 0
+    assert "use_openmp requires" in capfd.readouterr().out
 
-def test_using_azure_ci(cookies):
+
+@pytest.mark.slow
+def test_using_pytest(bake_cache):
+    result = bake_cache.bake()
+    assert result.project.isdir()
+    # Test contents of test file
+    test_file_path = result.project.join("tests/test_python_boilerplate.py")
+    lines = test_file_path.readlines()
+    assert "import pytest" in "".join(lines)
+    # Test the test alias (which invokes pytest)
+    run = run_pytest(str(result.project_path))
+    assert run.exit_code == 0, run.failed
+    assert run.passed
+
+
+def test_using_azure_ci(bake_cache):
     test_options = {"y": lambda x, y: x in y, "n": lambda x, y: x not in y}
     for answer, eval_func in test_options.items():
-        with bake_in_temp_dir(
-            cookies, extra_context={"use_azure_ci": answer}
-        ) as result:
-            found_toplevel_files = [
-                f.basename for f in result.project.listdir()
-            ]
-            assert eval_func("azure-pipelines.yml", found_toplevel_files)
-
-
-def test_using_cython(cookies):
-    with bake_in_temp_dir(
-        cookies, extra_context={"use_cython": "y"}
-    ) as result:
-        assert (
-            "cython"
-            in result.project.join("requirements-dev.txt").read().splitlines()
+        result = bake_cache.bake(extra_context={"use_azure_ci": answer})
+        found_toplevel_files = [f.basename for f in result.project.listdir()]
+        assert eval_func("azure-pipelines.yml", found_toplevel_files)
+
+
+def test_using_cython(bake_cache):
+    result = bake_cache.bake(extra_context={"compiler_backend": "cython"})
+    assert (
+        "cython"
+        in result.project.join("requirements-dev.txt").read().splitlines()
+    )
+    assert (
+        "from Cython.Build import cythonize"
+        in result.project.join("setup.py").read().splitlines()
+    )
+    package = result.project.join("python_boilerplate")
+    assert package.join("_speedups.pyx").isfile()
+    assert package.join("_speedups_py.py").isfile()
+
+    result = bake_cache.bake(extra_context={"compiler_backend": "none"})
+    package = result.project.join("python_boilerplate")
+    assert not package.join("_speedups.pyx").exists()
+    assert not package.join("speedups.py").exists()
+    assert not result.project.join("tests/test_speedups.py").exists()
+
+
+def test_using_mypyc(bake_cache):
+    result = bake_cache.bake(extra_context={"compiler_backend": "mypyc"})
+    assert (
+        "mypy"
+        in result.project.join("requirements-dev.txt").read().splitlines()
+    )
+    assert "from mypyc.build import mypycify" in (
+        result.project.join("setup.py").read().splitlines()
+    )
+    assert "[mypyc]" in result.project.join("setup.cfg").read()
+    assert result.project.join("python_boilerplate/stats.py").isfile()
+    assert result.project.join("tests/test_compiled.py").isfile()
+    assert not result.project.join("python_boilerplate/speedups.py").exists()
+
+    result = bake_cache.bake(extra_context={"compiler_backend": "cython"})
+    assert "[mypyc]" not in result.project.join("setup.cfg").read()
+    assert not result.project.join("python_boilerplate/stats.py").exists()
+    assert not result.project.join("tests/test_compiled.py").exists()
+
+
+def test_using_openmp(bake_cache):
+    result = bake_cache.bake(
+        extra_context={"compiler_backend": "cython", "use_openmp": "y"}
+    )
+    assert "-fopenmp" in result.project.join("setup.py").read()
+    package = result.project.join("python_boilerplate")
+    assert "prange" in package.join("_speedups.pyx").read()
+    assert "def dot(" in package.join("_speedups_py.py").read()
+
+    result = bake_cache.bake(
+        extra_context={"compiler_backend": "cython", "use_openmp": "n"}
+    )
+    assert "-fopenmp" not in result.project.join("setup.py").read()
+    package = result.project.join("python_boilerplate")
+    assert "prange" not in package.join("_speedups.pyx").read()
+    assert "def dot(" not in package.join("_speedups_py.py").read()
+
+
+@pytest.mark.slow
+def test_bake_with_cython_and_build(cookies):
+    """Every .pyx of the package is built, named by its dotted path"""
+    pytest.importorskip("Cython")
+    extra_context = {"compiler_backend": "cython"}
+    with bake_in_temp_dir(cookies, extra_context=extra_context) as result:
+        package = result.project_path.joinpath("python_boilerplate")
+        package.joinpath("sub").mkdir()
+        package.joinpath("sub", "__init__.py").touch()
+        package.joinpath("sub", "_fast.pyx").write_text(
+            "def add(int a, int b):\n    return a + b\n"
+        )
+        run_inside_dir(
+            ["python setup.py build_ext --inplace --parallel 2"],
+            str(result.project_path),
+        )
+        output = check_output_inside_dir(
+            'python -c "from python_boilerplate.sub import _fast; '
+            'print(_fast.add(1, 2), _fast.__file__)"',
+            str(result.project_path),
+        )
+        value, path = output.decode().split()
+        assert value == "3"
+        assert not path.endswith(".py")
+
+        # Content hashes of the inputs, read by incremental builds
+        manifest = result.project_path.joinpath("build", "cython-inputs.json")
+        inputs = json.loads(manifest.read_text())
+        assert list(inputs["python_boilerplate.sub._fast"]) == [
+            "python_boilerplate/sub/_fast.pyx",
+            "<profile>",
+        ]
+        assert inputs["python_boilerplate.sub._fast"]["<profile>"] == "release"
+
+        # The suite runs against both the compiled and pure-Python speedups
+        run = run_pytest(str(result.project_path))
+        assert run.exit_code == 0, run.failed
+        assert not run.skipped
+        nodeids = [r.nodeid for r in run.passed]
+        assert any(nodeid.endswith("[compiled]") for nodeid in nodeids)
+        assert any(nodeid.endswith("[python]") for nodeid in nodeids)
+
+
+@pytest.mark.slow
+def test_bake_with_mypyc_and_build(cookies):
+    """The modules listed in setup.cfg, and only them, load compiled"""
+    pytest.importorskip("mypyc")
+    extra_context = {"compiler_backend": "mypyc"}
+    with bake_in_temp_dir(cookies, extra_context=extra_context) as result:
+        project = str(result.project_path)
+        run_inside_dir(["invoke build"], project)
+        output = check_output_inside_dir(
+            'python -c "from python_boilerplate import stats; '
+            'print(stats.__file__)"',
+            project,
+        )
+        assert not output.decode().strip().endswith(".py")
+
+        # Compiled modules cannot reload in this process: use another one
+        output = check_output_inside_dir(
+            "python -m pytest -q -rs -p no:cacheprovider", project
         )
-        assert (
-            "from Cython.Build import cythonize"
-            in result.project.join("setup.py").read().splitlines()
+        assert b"skipped" not in output
+        assert b" passed" in output
+
+
+@pytest.mark.slow
+def test_bake_with_cython_and_build_pgo(cookies):
+    """The profiles of the training run are stored and reused"""
+    pytest.importorskip("Cython")
+    extra_context = {"compiler_backend": "cython"}
+    with bake_in_temp_dir(cookies, extra_context=extra_context) as result:
+        project = str(result.project_path)
+        output = check_output_inside_dir("invoke build --pgo", project)
+        assert b"-fprofile-generate" in output
+        assert b"-fprofile-use" in output
+        profiles = list(result.project_path.joinpath(".pgo").glob("**/*"))
+        assert profiles
+
+        # Neither trained nor recompiled again
+        output = check_output_inside_dir("invoke build --pgo", project)
+        assert b"-fprofile" not in output
+        assert list(result.project_path.joinpath(".pgo").glob("**/*")) == (
+            profiles
         )
+        # In a subprocess: NumPy, imported by the first run, cannot reload
+        run_inside_dir(["python -m pytest -q -p no:cacheprovider"], project)
+
+
+def test_using_benchmarks(bake_cache):
+    result = bake_cache.bake(extra_context={"use_benchmarks": "y"})
+    assert result.project.join("benchmarks/harness.py").isfile()
+    assert "def bench(c" in result.project.join("tasks.py").read()
+
+    assert not result.project.join("benchmarks/bench_speedups.py").exists()
+
+    result = bake_cache.bake(
+        extra_context={"compiler_backend": "cython", "use_benchmarks": "y"}
+    )
+    assert result.project.join("benchmarks/bench_speedups.py").isfile()
+
+    result = bake_cache.bake(extra_context={"use_benchmarks": "n"})
+    assert not result.project.join("benchmarks").exists()
+    assert not result.project.join("tests/test_benchmarks.py").exists()
+    assert "def bench(c" not in result.project.join("tasks.py").read()
+
+
+@pytest.mark.slow
+def test_bake_with_benchmarks_and_run_tests(bake_cache):
+    result = bake_cache.bake(extra_context={"use_benchmarks": "y"})
+    run = run_pytest(str(result.project_path))
+    assert run.exit_code == 0, run.failed
+    assert any("test_benchmarks" in r.nodeid for r in run.passed)
+
+
+def test_using_lazy_imports(bake_cache):
+    result = bake_cache.bake(extra_context={"use_lazy_imports": "y"})
+    init_file = result.project.join("python_boilerplate/__init__.py").read()
+    assert "def __getattr__(name):" in init_file
+    assert "def __dir__():" in init_file
+    assert result.project.join("tests/test_exports.py").isfile()
+
+    result = bake_cache.bake(extra_context={"use_lazy_imports": "n"})
+    init_file = result.project.join("python_boilerplate/__init__.py").read()
+    assert "__getattr__" not in init_file
+    assert not result.project.join("tests/test_exports.py").exists()
+
+
+@pytest.mark.slow
+def test_bake_with_lazy_imports_and_run_tests(bake_cache):
+    result = bake_cache.bake(extra_context={"use_lazy_imports": "y"})
+    run = run_pytest(str(result.project_path))
+    assert run.exit_code == 0, run.failed
+    assert any("test_exports" in r.nodeid for r in run.passed)
+
+
+def test_option_matrix(matrix_bakes, matrix_context):
+    """Bake and validate every combination of the template options"""
+    bake = matrix_bakes[context_hash(matrix_context)]
+    assert bake.error is None, bake.error
+
+    project_dir = bake.project_dir
+    found_toplevel_files = os.listdir(project_dir)
+    assert ("LICENSE" in found_toplevel_files) == (
+        matrix_context["select_license"] != "None"
+    )
+    assert ("azure-pipelines.yml" in found_toplevel_files) == (
+        matrix_context["use_azure_ci"] == "y"
+    )
+    with open(os.path.join(project_dir, "requirements-dev.txt")) as file:
+        requirements = file.read().splitlines()
+    backend = matrix_context["compiler_backend"]
+    assert ("cython" in requirements) == (backend == "cython")
+    assert ("mypy" in requirements) == (backend == "mypyc")
+
+
+def test_snapshot(request, matrix_bakes, matrix_context):
+    """Compare every combination of the options with its golden manifest"""
+    bake = matrix_bakes[context_hash(matrix_context)]
+    assert bake.error is None, bake.error
+
+    template_dir = request.config.option.template
+    context = resolve_context(template_dir, matrix_context)
+    manifest = build_manifest(
+        bake.project_dir, templated_files(template_dir, context)
+    )
+    name = context_id(matrix_context)
+    if request.config.getoption("snapshot_update"):
+        save_snapshot(name, manifest)
+
+    expected = load_snapshot(name)
+    assert expected is not None, (
+        "No snapshot for {}: run pytest --snapshot-update".format(name)
+    )
+    differences = diff_manifests(expected, manifest)
+    assert not differences, "\n".join(differences)
+
+
+def test_bake_batch(tmp_path):
+    contexts = [
+        {"project_name": "Alpha"},
+        {"project_name": "Beta", "select_license": "None"},
+    ]
+    reports = bake_batch(contexts, str(tmp_path), workers=2)
+    assert [report.error for report in reports] == [None, None]
+    assert os.path.isfile(os.path.join(reports[0].project_dir, "LICENSE"))
+    assert not os.path.exists(os.path.join(reports[1].project_dir, "LICENSE"))
+
+
+def test_bake_batch_validates_every_context_first(tmp_path):
+    contexts = [{"project_name": "Alpha"}, {"project_slug": "not-valid"}]
+    reports = bake_batch(contexts, str(tmp_path))
+    assert all(report.project_dir is None for report in reports)
+    assert "not-valid" in reports[1].error
+    assert not os.listdir(str(tmp_path))
+
+
+def test_bake_batch_rejects_duplicate_slugs(tmp_path):
+    contexts = [
+        {"project_name": "Alpha"},
+        {"project_name": "Beta"},
+        {"project_slug": "alpha", "select_license": "None"},
+    ]
+    reports = bake_batch(contexts, str(tmp_path))
+    assert all(report.project_dir is None for report in reports)
+    assert "(alpha) is shared by rows 0, 2" in reports[0].error
+    assert reports[1].error == "Not baked"
+    assert reports[2].error == reports[0].error
+    assert not os.listdir(str(tmp_path))
@@ -0,0 +1,49 @@
+import argparse
+import json
+
+from benchmarks import harness
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description="Run the benchmarks"
+    )
+    parser.add_argument("pattern", nargs="?", help="regex of names to run")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.02,
+        help="minimum duration of a repeat in seconds",
+    )
+    parser.add_argument(
+        "--no-history", action="store_true", help="do not record the results"
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="print the records with their timings as JSON, recording nothing",
+    )
+    args = parser.parse_args()
+
+    records = harness.run(
+        args.pattern, args.repeat, args.warmup, args.min_time, args.json
+    )
+    if args.json:
+        print(json.dumps(records))
+        return
+    columns = ("min", "median", "p95")
+    print(f"{'benchmark':30} {'loops':>8} ", end="")
+    print(" ".join(f"{column:>10}" for column in columns))
+    for record in records:
+        times = [harness.format_time(record[column]) for column in columns]
+        print(f"{record['benchmark']:30} {record['loops']:>8} ", end="")
+        print(" ".join(f"{t:>10}" for t in times))
+    if not args.no_history:
+        harness.append_history(records)
+        print(f"Recorded in {harness.HISTORY_FILE}")
+
+
+if __name__ == "__main__":
+    main()
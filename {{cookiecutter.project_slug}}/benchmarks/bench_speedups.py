@@ -0,0 +1,65 @@
+"""
+{%- if cookiecutter.use_openmp == "y" %}
+axpy and dot kernels: compiled typed-memoryview loops, dot in OpenMP threads,
+against the pure-Python loops and, when NumPy is installed, vectorized axpy
+{%- else %}
+axpy kernel: compiled typed-memoryview loop against the pure-Python loop
+and, when NumPy is installed, its vectorized equivalent
+{%- endif %}
+"""
+from array import array
+
+from benchmarks.harness import benchmark
+from {{ cookiecutter.project_slug }} import _speedups_py
+
+SIZE = 100000
+ALPHA = 0.5
+X = array("d", range(SIZE))
+Y = array("d", range(SIZE))
+OUT = array("d", bytes(8 * SIZE))
+
+
+@benchmark
+def axpy_python():
+    _speedups_py.axpy(ALPHA, X, Y, OUT)
+
+
+try:
+    from {{ cookiecutter.project_slug }} import _speedups
+except ImportError:
+    # Not built: run 'invoke build'
+    _speedups = None
+else:
+
+    @benchmark
+    def axpy_compiled():
+        _speedups.axpy(ALPHA, X, Y, OUT)
+
+
+try:
+    import numpy
+except ImportError:
+    pass
+else:
+    NUMPY_X = numpy.frombuffer(X)
+    NUMPY_Y = numpy.frombuffer(Y)
+    NUMPY_OUT = numpy.frombuffer(OUT)
+
+    @benchmark
+    def axpy_numpy():
+        numpy.multiply(NUMPY_X, ALPHA, out=NUMPY_OUT)
+        numpy.add(NUMPY_OUT, NUMPY_Y, out=NUMPY_OUT)
+{%- if cookiecutter.use_openmp == "y" %}
+
+
+@benchmark
+def dot_python():
+    _speedups_py.dot(X, Y)
+
+
+if _speedups is not None:
+
+    @benchmark
+    def dot_compiled():
+        _speedups.dot(X, Y)
+{%- endif %}
@@ -0,0 +1,41 @@
+"""
+stats functions compiled by mypyc against the same source interpreted
+"""
+import importlib.util
+from pathlib import Path
+
+from benchmarks.harness import benchmark
+from {{ cookiecutter.project_slug }} import stats
+
+
+def _load_interpreted():
+    """Load stats.py from its source, even when its compiled module is built"""
+    path = Path(stats.__file__).with_name("stats.py")
+    spec = importlib.util.spec_from_file_location("_stats_interpreted", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+INTERPRETED = _load_interpreted()
+VALUES = [float(i % 100) for i in range(10000)]
+
+
+@benchmark
+def variance():
+    stats.variance(VALUES)
+
+
+@benchmark
+def variance_interpreted():
+    INTERPRETED.variance(VALUES)
+
+
+@benchmark
+def moving_average():
+    stats.moving_average(VALUES, 10)
+
+
+@benchmark
+def moving_average_interpreted():
+    INTERPRETED.moving_average(VALUES, 10)
@@ -0,0 +1,14 @@
+"""Example benchmarks: replace them with the hot paths of {{ cookiecutter.project_slug }}"""
+from benchmarks.harness import benchmark
+
+DATA = list(range(10000))
+
+
+@benchmark
+def sum_list():
+    sum(DATA)
+
+
+@benchmark(name="sorted_list")
+def sort_list():
+    sorted(DATA)
@@ -0,0 +1,216 @@
+"""
+Minimal benchmark harness.
+
+Benchmarks are functions without arguments decorated with @benchmark in the
+bench_*.py modules of this package. Each one is warmed up, calibrated to a
+number of loops per repeat lasting at least min_time, then timed for a
+number of repeats. Results are appended to a JSON-lines history keyed by git
+commit and machine fingerprint, so that runs can be compared over time.
+"""
+import gc
+import hashlib
+import importlib
+import json
+import os
+import pkgutil
+import platform
+import random
+import re
+import subprocess
+import time
+from datetime import datetime, timezone
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORY_FILE = os.path.join(ROOT_DIR, ".benchmarks", "history.jsonl")
+
+BENCHMARKS = {}
+# Fewest paired samples whose bootstrap interval is worth a verdict
+MIN_PAIRS = 10
+
+
+def benchmark(func=None, *, name=None):
+    """Register a function as a benchmark, optionally under another name"""
+
+    def register(func):
+        BENCHMARKS[name or func.__name__] = func
+        return func
+
+    return register(func) if func is not None else register
+
+
+def discover():
+    """Import every bench_*.py module of this package, registering them"""
+    for module in pkgutil.iter_modules([os.path.dirname(__file__)]):
+        if module.name.startswith("bench_"):
+            importlib.import_module(f"{__package__}.{module.name}")
+    return BENCHMARKS
+
+
+def _time_loops(func, loops):
+    timer = time.perf_counter
+    start = timer()
+    for _ in range(loops):
+        func()
+    return timer() - start
+
+
+def calibrate(func, min_time):
+    """Return the number of loops of func lasting at least min_time seconds"""
+    loops = 1
+    while True:
+        if _time_loops(func, loops) >= min_time:
+            return loops
+        loops *= 2
+
+
+def measure(func, repeat=20, warmup=3, min_time=0.02):
+    """
+    Time func, returning the seconds per call of every repeat
+    :param func: Callable without arguments.
+    :param repeat: Int, number of timed repeats.
+    :param warmup: Int, number of untimed repeats run first.
+    :param min_time: Float, minimum duration of a repeat in seconds.
+    """
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        loops = calibrate(func, min_time)
+        for _ in range(warmup):
+            _time_loops(func, loops)
+        return loops, [_time_loops(func, loops) / loops for _ in range(repeat)]
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def percentile(values, percent):
+    """Linearly interpolated percentile of values, with 0 <= percent <= 100"""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    fraction = position - lower
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * fraction
+
+
+def summarize(timings):
+    return {
+        "min": min(timings),
+        "median": percentile(timings, 50),
+        "p95": percentile(timings, 95),
+        "max": max(timings),
+    }
+
+
+def bootstrap_change(
+    baseline, current, confidence=0.95, resamples=2000, seed=0
+):
+    """
+    Relative change from paired baseline and current times, e.g. measured
+    in the same round, with its bootstrap confidence interval, returned as
+    (change, low, high). A positive change is a slowdown: 0.03 is 3% slower
+    """
+    rng = random.Random(seed)
+    ratios = [after / before for before, after in zip(baseline, current)]
+    estimates = [
+        percentile(rng.choices(ratios, k=len(ratios)), 50) - 1
+        for _ in range(resamples)
+    ]
+    tail = (1 - confidence) / 2 * 100
+    return (
+        percentile(ratios, 50) - 1,
+        percentile(estimates, tail),
+        percentile(estimates, 100 - tail),
+    )
+
+
+def verdict(change, low, high, threshold, pairs):
+    """
+    Judge a bootstrap_change of pairs samples: 'SLOWER' or 'faster' by more
+    than threshold, or 'no significant change' when its interval contains 0,
+    is wider than threshold or comes from less than MIN_PAIRS pairs
+    """
+    if pairs < MIN_PAIRS or low <= 0 <= high or high - low > threshold:
+        return "no significant change"
+    if change > threshold:
+        return "SLOWER"
+    if -change > threshold:
+        return "faster"
+    return ""
+
+
+def format_time(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g} {unit}"
+    return f"{seconds / 1e-9:.3g} ns"
+
+
+def machine_fingerprint():
+    """Short hash of what makes timings comparable between runs"""
+    machine = "|".join(
+        str(value)
+        for value in (
+            platform.node(),
+            platform.machine(),
+            platform.processor(),
+            platform.python_implementation(),
+            platform.python_version(),
+            os.cpu_count(),
+        )
+    )
+    return hashlib.sha256(machine.encode()).hexdigest()[:16]
+
+
+def git_commit():
+    """Return the current commit, suffixed with '+dirty' for local changes"""
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT_DIR,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        ).strip()
+        status = subprocess.check_output(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=ROOT_DIR,
+            universal_newlines=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("+dirty" if status.strip() else "")
+
+
+def append_history(records, path=HISTORY_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as file:
+        for record in records:
+            file.write(json.dumps(record, sort_keys=True) + "\n")
+
+
+def run(pattern=None, repeat=20, warmup=3, min_time=0.02, timings=False):
+    """
+    Run the benchmarks whose name matches pattern, returning records, which
+    include the time per call of every repeat if timings is true
+    """
+    commit = git_commit()
+    machine = machine_fingerprint()
+    timestamp = datetime.now(timezone.utc).isoformat()
+    records = []
+    for name, func in sorted(discover().items()):
+        if pattern and not re.search(pattern, name):
+            continue
+        loops, seconds = measure(func, repeat, warmup, min_time)
+        record = {
+            "benchmark": name,
+            "commit": commit,
+            "machine": machine,
+            "timestamp": timestamp,
+            "loops": loops,
+            "repeat": repeat,
+        }
+        record.update(summarize(seconds))
+        if timings:
+            record["timings"] = seconds
+        records.append(record)
+    return records
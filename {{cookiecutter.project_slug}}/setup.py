@@ -1,9 +1,35 @@
-from setuptools import setup, find_packages
+{%- if cookiecutter.compiler_backend == "cython" %}
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import sysconfig
+from pathlib import Path
+
+from setuptools import Extension, setup, find_packages
+from setuptools.command.build_ext import build_ext
 from {{ cookiecutter.project_slug }} import _about
-{% if cookiecutter.use_cython == "y" %}
+
 from Cython.Build import cythonize
-from Cython.Distutils import build_ext
-{% endif %}
+from Cython.Build.Dependencies import create_dependency_tree
+{%- elif cookiecutter.compiler_backend == "mypyc" %}
+import configparser
+import json
+import os
+import subprocess
+from pathlib import Path
+
+from setuptools import setup, find_packages
+from setuptools.command.build_ext import build_ext
+from {{ cookiecutter.project_slug }} import _about
+
+from mypyc.build import mypycify
+{%- else %}
+from setuptools import setup, find_packages
+from {{ cookiecutter.project_slug }} import _about
+{%- endif %}
 
 with open("README.rst") as readme_file:
     readme = readme_file.read()
@@ -11,59 +37,291 @@ with open("README.rst") as readme_file:
 requirements = open("requirements.txt").read().splitlines()
 test_requirements = ["pytest"]
 
-{% if cookiecutter.use_cython == "y" %}
+{% if cookiecutter.compiler_backend == "cython" %}
 COMPILER_DIRECTIVES = {
-    "language_level": -3,
+    "language_level": 3,
+}
+# Processes cythonizing and compiling the extensions, set by 'invoke build'
+BUILD_JOBS = int(os.environ.get("BUILD_JOBS", 0)) or os.cpu_count()
+# Only rebuild the extensions whose inputs changed, set by 'invoke build'
+INCREMENTAL_BUILD = os.environ.get("INCREMENTAL_BUILD") == "1"
+BUILD_MANIFEST = Path("build", "cython-inputs.json")
+HEADER_REGEX = re.compile(
+    r'(?:extern\s+from|#\s*include)\s+"([^"]+)"'
+)
+{%- elif cookiecutter.compiler_backend == "mypyc" %}
+# Plain typed modules compiled by mypyc, listed in setup.cfg
+MYPYC_SECTION = "mypyc"
+BUILD_MANIFEST = Path("build", "mypyc-inputs.json")
+{%- endif %}
+{%- if cookiecutter.compiler_backend != "none" %}
+# Optimisation profile of the C compiler, set by 'invoke build'
+BUILD_PROFILE = os.environ.get("BUILD_PROFILE", "release")
+COMPILE_ARGS = {
+    # Profile: (gcc/clang arguments, msvc arguments)
+    "release": (["-O3"], ["/O2"]),
+    "native": (["-O3", "-march=native"], ["/O2"]),
+    "debug": (["-O0", "-g", "-UNDEBUG"], ["/Od", "/Zi"]),
+}
+# Profile-guided optimisation, set by 'invoke build --pgo': "generate"
+# instrumented extensions writing their profiles to PGO_DIR, or "use" them
+PGO = os.environ.get("PGO")
+PGO_DIR = os.path.abspath(os.environ.get("PGO_DIR", ".pgo"))
+PGO_ARGS = {
+    # Mode: (compile arguments, link arguments)
+    "generate": (
+        [f"-fprofile-generate={PGO_DIR}"],
+        [f"-fprofile-generate={PGO_DIR}"],
+    ),
+    "use": ([f"-fprofile-use={PGO_DIR}"], []),
 }
+# gcc fails on profiles of sources edited since, and threads race on the
+# counters: tolerate both ('invoke build --pgo' warns about stale profiles)
+GCC_PGO_USE_ARGS = [
+    "-fprofile-correction",
+    "-Wno-coverage-mismatch",
+    "-Wno-missing-profile",
+]
+# Launchers of the compiler, as with 'invoke build --ccache'
+COMPILER_WRAPPERS = ("ccache", "sccache")
+# Recorded in the build manifest: switching it rebuilds everything
+BUILD_TAG = f"{BUILD_PROFILE}+pgo-{PGO}" if PGO else BUILD_PROFILE
+{%- if cookiecutter.use_openmp == "y" %}
+OPENMP_ARGS = {
+    # Platform: (compile arguments, link arguments)
+    "msvc": (["/openmp"], []),
+    "darwin": (["-Xpreprocessor", "-fopenmp"], ["-lomp"]),
+    "unix": (["-fopenmp"], ["-fopenmp"]),
+}
+{%- endif %}
+
+
+class BuildExt(build_ext):
+    """
+    Compile with the arguments of the build profile, of PGO{% if cookiecutter.use_openmp == "y" %} and of OpenMP{% endif %},
+    which depend on the compiler only known at build time
+    """
+
+    # The inputs of the extensions, recorded by successful in-place builds
+    inputs = None
 
-ext_modules = []
-for path in Path("cyranking/").glob("**/*.pyx"):
-    name = str(path).replace(".pyx", "").replace("/", ".")
-    ext = Extension(
-        str(path.parent),
-        [str(path)]
+    def run(self):
+        super().run()
+        # sdist, bdist_wheel or a build into build/ leave the in-place
+        # extensions as they were
+        if self.inplace and self.inputs is not None:
+            BUILD_MANIFEST.parent.mkdir(exist_ok=True)
+            BUILD_MANIFEST.write_text(json.dumps(self.inputs, indent=1))
+
+    def build_extensions(self):
+        profiles = {hashes.get("<profile>") for hashes in _built().values()}
+        if profiles != {BUILD_TAG}:
+            # Timestamps miss a profile switch: recompile everything
+            self.force = True
+        msvc = self.compiler.compiler_type == "msvc"
+        compile_args = list(COMPILE_ARGS[BUILD_PROFILE][msvc])
+        link_args = []
+{%- if cookiecutter.use_openmp == "y" %}
+        if msvc:
+            openmp_platform = "msvc"
+        elif sys.platform == "darwin":
+            openmp_platform = "darwin"
+        else:
+            openmp_platform = "unix"
+        openmp_compile_args, openmp_link_args = OPENMP_ARGS[openmp_platform]
+        compile_args += openmp_compile_args
+        link_args += openmp_link_args
+{%- endif %}
+        if PGO:
+            if msvc:
+                raise SystemExit("PGO builds need gcc or clang")
+            pgo_compile_args, pgo_link_args = PGO_ARGS[PGO]
+            compile_args += pgo_compile_args
+            link_args += pgo_link_args
+            if PGO == "use" and not _is_clang(self.compiler.compiler_so):
+                compile_args += GCC_PGO_USE_ARGS
+        for extension in self.extensions:
+            # New lists: extensions may share theirs
+            extension.extra_compile_args = (
+                extension.extra_compile_args + compile_args
+            )
+            extension.extra_link_args = extension.extra_link_args + link_args
+        super().build_extensions()
+
+
+def _is_clang(command):
+    """
+    Whether the compiler of a command line is clang, which may be installed
+    as cc or gcc, behind a wrapper like ccache
+    """
+    compiler = next(
+        (
+            part
+            for part in command
+            if os.path.basename(part) not in COMPILER_WRAPPERS
+        ),
+        command[0],
     )
-    ext_modules.append(ext)
-ext_modules = cythonize(ext_modules, compiler_directives=COMPILER_DIRECTIVES)
-{% endif %}
+    version = subprocess.run(
+        [compiler, "--version"],
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    return "clang" in version.stdout
 
+
+def _built():
+    """Return the content hashes of the inputs of the last build"""
+    try:
+        return json.loads(BUILD_MANIFEST.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+{%- if cookiecutter.compiler_backend == "cython" %}
+
+
+def _headers(path, seen):
+    """Collect the local headers included by path, recursively"""
+    for header in HEADER_REGEX.findall(path.read_text(errors="replace")):
+        for directory in (path.parent, Path(".")):
+            candidate = directory.joinpath(header)
+            if candidate.is_file() and candidate not in seen:
+                seen.add(candidate)
+                _headers(candidate, seen)
+                break
+    return seen
+
+
+def _input_hashes(source, tree):
+    """Hash the content of a .pyx and of its transitive .pxd/.pxi/headers"""
+    inputs = {Path(p) for p in tree.all_dependencies(str(source))}
+    inputs.add(source)
+    for path in list(inputs):
+        _headers(path, inputs)
+    return {
+        path.as_posix(): hashlib.sha256(path.read_bytes()).hexdigest()
+        for path in sorted(inputs)
+    }
+
+
+def _stale(extensions, inputs):
+    """Return the extensions whose inputs changed since the last build"""
+    previous = _built()
+    suffix = sysconfig.get_config_var("EXT_SUFFIX")
+    return [
+        extension
+        for extension in extensions
+        if previous.get(extension.name) != inputs[extension.name]
+        or not Path(*extension.name.split(".")).with_suffix(suffix).exists()
+    ]
+
+
+def cython_extensions():
+    """
+    Build an extension for every .pyx module, named by its dotted path.
+    Return them with the content hashes of their inputs
+    """
+    sources = sorted(Path("{{ cookiecutter.project_slug }}").glob("**/*.pyx"))
+    extensions = [
+        Extension(".".join(path.with_suffix("").parts), [str(path)])
+        for path in sources
+    ]
+    tree = create_dependency_tree()
+    inputs = {
+        extension.name: _input_hashes(source, tree)
+        for extension, source in zip(extensions, sources)
+    }
+    for hashes in inputs.values():
+        hashes["<profile>"] = BUILD_TAG
+    if INCREMENTAL_BUILD:
+        stale = _stale(extensions, inputs)
+        print(f"Rebuilding {len(stale)} of {len(extensions)} extensions")
+        extensions = stale
+    extensions = cythonize(
+        extensions,
+        compiler_directives=COMPILER_DIRECTIVES,
+        nthreads=BUILD_JOBS,
+        force=INCREMENTAL_BUILD,
+    )
+    return extensions, inputs
+{%- elif cookiecutter.compiler_backend == "mypyc" %}
+
+
+def mypyc_modules():
+    """Return the paths of the modules to compile, listed in setup.cfg"""
+    config = configparser.ConfigParser()
+    config.read("setup.cfg")
+    return config.get(MYPYC_SECTION, "modules").split()
+
+
+def mypyc_extensions():
+    """
+    Compile the listed modules with mypyc, which type checks them first.
+    Return the extensions with the build profile of each
+    """
+    extensions = mypycify(
+        mypyc_modules(), group_name="{{ cookiecutter.project_slug }}"
+    )
+    inputs = {
+        extension.name: {"<profile>": BUILD_TAG} for extension in extensions
+    }
+    return extensions, inputs
+{%- endif %}
+{% endif %}
 {%- set license_classifiers = {
     "Apache Software License 2.0": "License :: OSI Approved :: Apache Software License",
 } %}
 
-setup(
-    author=_about.__author__,
-    author_email=_about.__email__,
-    python_requires=">=3.6",
-    classifiers=[
-        "Development Status :: 2 - Pre-Alpha",
-        "Intended Audience :: Developers",
+# Cythonizing in parallel spawns processes importing this module on some
+# platforms, which must not run setup() again
+if __name__ == "__main__":
+{%- if cookiecutter.compiler_backend == "cython" %}
+    ext_modules, BuildExt.inputs = cython_extensions()
+{%- elif cookiecutter.compiler_backend == "mypyc" %}
+    ext_modules, BuildExt.inputs = mypyc_extensions()
+{%- endif %}
+    setup(
+        author=_about.__author__,
+        author_email=_about.__email__,
+        python_requires=">=3.6",
+        classifiers=[
+            "Development Status :: 2 - Pre-Alpha",
+            "Intended Audience :: Developers",
 {%- if cookiecutter.select_license in license_classifiers %}
-        "{{ license_classifiers[cookiecutter.select_license] }}",
+            "{{ license_classifiers[cookiecutter.select_license] }}",
 {%- endif %}
-        "Natural Language :: English",
-        "Programming Language :: Python :: 3.6",
-        "Programming Language :: Python :: 3.7",
-        "Programming Language :: Python :: 3.8",
-    ],
-    description=_about.__summary__,
-    install_requires=requirements,
+            "Natural Language :: English",
+            "Programming Language :: Python :: 3.6",
+            "Programming Language :: Python :: 3.7",
+            "Programming Language :: Python :: 3.8",
+        ],
+        description=_about.__summary__,
+        install_requires=requirements,
 {%- if cookiecutter.select_license in license_classifiers %}
-    license="{{cookiecutter.select_license}}",
+        license="{{cookiecutter.select_license}}",
 {%- endif %}
-    long_description=readme,
-    include_package_data=True,
-    keywords=_about.__title__,
-    name=_about.__title__,
-    packages=find_packages(),
-    test_suite="tests",
-    tests_require=test_requirements,
-    url=f"https://github.com/{{ cookiecutter.github_username }}/{_about.__title__}",
-    version=_about.__version__,
-    zip_safe=False,
-{%- if cookiecutter.use_cython == "y" %}
-    ext_module=ext_modules,
-    package_data={"": ["*.pyx", "*.pxd"]},
-    cmdclass={"build_ext": build_ext},
+        long_description=readme,
+        include_package_data=True,
+        keywords=_about.__title__,
+        name=_about.__title__,
+{%- if cookiecutter.use_benchmarks == "y" %}
+        packages=find_packages(exclude=["benchmarks", "benchmarks.*"]),
+{%- else %}
+        packages=find_packages(),
 {%- endif %}
-)
+        test_suite="tests",
+        tests_require=test_requirements,
+        url=f"https://github.com/{{ cookiecutter.github_username }}/{_about.__title__}",
+        version=_about.__version__,
+        zip_safe=False,
+{%- if cookiecutter.compiler_backend != "none" %}
+        ext_modules=ext_modules,
+{%- endif %}
+{%- if cookiecutter.compiler_backend == "cython" %}
+        package_data={"": ["*.pyx", "*.pxd"]},
+{%- endif %}
+{%- if cookiecutter.compiler_backend != "none" %}
+        cmdclass={"build_ext": BuildExt},
+{%- endif %}
+    )
@@ -3,24 +3,55 @@ Tasks for maintaining the project.
 
 Execute 'invoke --list' for guidance on using Invoke
 """
+import configparser
+import os
+import json
+import re
 import shutil
 import platform
+import sysconfig
+{%- if cookiecutter.use_benchmarks == "y" %}
+import tempfile
+{%- endif %}
 
-from invoke import task
+from invoke import Exit, task
 from pathlib import Path
 
 
 ROOT_DIR = Path(__file__).parent
 SETUP_FILE = ROOT_DIR.joinpath("setup.py")
+SETUP_CFG = ROOT_DIR.joinpath("setup.cfg")
 TEST_DIR = ROOT_DIR.joinpath("tests")
 SOURCE_DIR = ROOT_DIR.joinpath("{{ cookiecutter.project_slug }}")
+{%- if cookiecutter.use_benchmarks == "y" %}
+BENCHMARKS_DIR = ROOT_DIR.joinpath("benchmarks")
+{%- endif %}
+BUILD_PROFILES = ["release", "native", "debug"]
+PROFILES_DIR = ROOT_DIR.joinpath(".profiles")
+PROFILE_MODES = ["deterministic", "sampling"]
+PGO_DIR = ROOT_DIR.joinpath(".pgo")
+{%- if cookiecutter.use_benchmarks == "y" %}
+PGO_WORKLOAD = "python -m benchmarks --no-history --repeat 5 --warmup 1"
+{%- else %}
+PGO_WORKLOAD = "python -m pytest -q -p no:cacheprovider"
+{%- endif %}
 COVERAGE_FILE = ROOT_DIR.joinpath(".coverage")
 COVERAGE_DIR = ROOT_DIR.joinpath("htmlcov")
 COVERAGE_REPORT = COVERAGE_DIR.joinpath("index.html")
+# The tests running each source file, from the per-test coverage contexts
+TEST_IMPACT_DIR = ROOT_DIR.joinpath(".testimpact")
+TEST_MAP = TEST_IMPACT_DIR.joinpath("map.json")
+TEST_SELECTION = TEST_IMPACT_DIR.joinpath("selected.txt")
+# Changes of these files affect no test
+NO_IMPACT_SUFFIXES = (".md", ".rst")
 DOCS_DIR = ROOT_DIR.joinpath("docs")
 DOCS_BUILD_DIR = DOCS_DIR.joinpath("_build")
 DOCS_INDEX = DOCS_BUILD_DIR.joinpath("index.html")
+{%- if cookiecutter.use_benchmarks == "y" %}
+PYTHON_DIRS = [str(d) for d in [SOURCE_DIR, TEST_DIR, BENCHMARKS_DIR]]
+{%- else %}
 PYTHON_DIRS = [str(d) for d in [SOURCE_DIR, TEST_DIR]]
+{%- endif %}
 
 
 def _delete_file(file):
@@ -34,6 +65,88 @@ def _delete_file(file):
             pass
 
 
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+class _ImportNode:
+    def __init__(self, name, self_us, cumulative_us):
+        self.name = name
+        self.self_us = self_us
+        self.cumulative_us = cumulative_us
+        self.children = []
+
+
+def _parse_importtime(output):
+    """
+    Build the import tree from the output of 'python -X importtime'. A module
+    is reported after its own imports, one indentation level deeper
+    """
+    pending = []
+    for line in output.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        depth = len(indent) // 2
+        node = _ImportNode(name, int(self_us), int(cumulative_us))
+        while pending and pending[-1][0] > depth:
+            node.children.insert(0, pending.pop()[1])
+        pending.append((depth, node))
+    return [node for _, node in pending]
+
+
+def _walk_imports(nodes, depth=0):
+    for node in nodes:
+        yield depth, node
+        yield from _walk_imports(node.children, depth + 1)
+
+
+def _measure_imports(c, args, repeat):
+    """Run python -X importtime repeat times, keeping the fastest run"""
+    baseline = {
+        node.name
+        for node in _parse_importtime(
+            c.run("python -X importtime -c pass", hide=True).stderr
+        )
+    }
+    best = None
+    for _ in range(repeat):
+        result = c.run(f"python -X importtime {args}", hide=True, warn=True)
+        if result.failed:
+            # Without the importtime lines, the traceback
+            errors = [
+                line
+                for line in result.stderr.splitlines()
+                if not line.startswith("import time:")
+            ]
+            raise Exit(f"python {args} failed:\n" + "\n".join(errors))
+        # Interpreter startup imports are not ours to budget
+        roots = [
+            node
+            for node in _parse_importtime(result.stderr)
+            if node.name not in baseline
+        ]
+        total = sum(node.cumulative_us for node in roots)
+        if best is None or total < best[0]:
+            best = (total, roots)
+    return best
+
+
+def _importtime_budgets():
+    """Read the thresholds in milliseconds from the [importtime] sections"""
+    config = configparser.ConfigParser()
+    config.read(SETUP_CFG)
+    section = config["importtime"] if config.has_section("importtime") else {}
+    total_ms = float(section.get("total_ms", "inf"))
+    module_ms = float(section.get("module_ms", "inf"))
+    modules = {}
+    if config.has_section("importtime:modules"):
+        modules = {
+            name: float(ms) for name, ms in config["importtime:modules"].items()
+        }
+    return total_ms, module_ms, modules
+
+
 @task(help={'check': "Checks if source is formatted without applying changes"})
 def format(c, check=False):
     """
@@ -102,30 +215,426 @@ def lint(c):
     """
 
 
-@task
-def build(c):
+def _build_ext(c, jobs, env):
+    c.run(
+        "python {} build_ext --inplace --parallel {}".format(SETUP_FILE, jobs),
+        env=env,
+        pty=platform.system() == 'Linux',
+    )
+
+
+def _pgo_profiles():
+    """Return the profiles of a training run stored in PGO_DIR"""
+    profdata = PGO_DIR.joinpath("default.profdata")
+    if profdata.exists():
+        return [profdata]
+    return list(PGO_DIR.glob("**/*.gcda"))
+
+
+def _pgo_stale(profiles):
+    """Whether Cython sources changed since the training run of profiles"""
+    trained = min(p.stat().st_mtime for p in profiles)
+    return any(
+        path.stat().st_mtime > trained
+        for pattern in ("**/*.pyx", "**/*.pxd", "**/*.pxi")
+        for path in SOURCE_DIR.glob(pattern)
+    )
+
+
+def _pgo_train(c, jobs, env):
+    """
+    Build instrumented extensions and run the workload to store its profiles
+    """
+    shutil.rmtree(PGO_DIR, ignore_errors=True)
+    _build_ext(c, jobs, dict(env, PGO="generate"))
+    c.run(PGO_WORKLOAD, pty=platform.system() == 'Linux')
+    raw_profiles = sorted(str(p) for p in PGO_DIR.glob("*.profraw"))
+    if raw_profiles:
+        # clang writes raw profiles, merged into the one -fprofile-use reads
+        tool = "llvm-profdata"
+        if platform.system() == "Darwin":
+            tool = "xcrun llvm-profdata"
+        output = PGO_DIR.joinpath("default.profdata")
+        c.run(f"{tool} merge -output={output} {' '.join(raw_profiles)}")
+    if not _pgo_profiles():
+        raise Exit(
+            f"The training run stored no profiles in {PGO_DIR}: it must"
+            " import the compiled modules"
+        )
+
+
+@task(help={
+    'jobs': "Parallel cythonize and compile jobs (default: CPU count)",
+    'incremental': "Only rebuild the extensions whose inputs changed",
+    'ccache': "Compile the generated C code through ccache",
+    'profile': "Optimisation profile: release (-O3), native (-O3"
+               " -march=native) or debug (-O0 -g)",
+    'pgo': "Optimise with the profiles of a training run, stored in .pgo/"
+           " and reused by later builds",
+    'train': "Run the training again for --pgo, after editing the code",
+})
+def build(
+    c,
+    jobs=None,
+    incremental=False,
+    ccache=False,
+    profile="release",
+    pgo=False,
+    train=False,
+):
+    """
+    Build the compiled extensions in place
+    """
+    if profile not in BUILD_PROFILES:
+        raise Exit(f"Unknown profile {profile}, use one of {BUILD_PROFILES}")
+    jobs = int(jobs or os.cpu_count())
+    env = {"BUILD_JOBS": str(jobs), "BUILD_PROFILE": profile}
+    if incremental:
+        env["INCREMENTAL_BUILD"] = "1"
+    if ccache:
+        if not shutil.which("ccache"):
+            raise Exit("ccache not found")
+        compiler = os.environ.get("CC") or sysconfig.get_config_var("CC")
+        env["CC"] = f"ccache {compiler}"
+    if pgo:
+        if platform.system() == "Windows":
+            raise Exit("PGO builds need gcc or clang")
+        env["PGO_DIR"] = str(PGO_DIR)
+        profiles = _pgo_profiles()
+        if train or not profiles:
+            _pgo_train(c, jobs, env)
+        elif _pgo_stale(profiles):
+            print("The sources changed since the PGO training: its profiles"
+                  " may be out of date, run with --train to refresh them")
+        env["PGO"] = "use"
+    _build_ext(c, jobs, env)
+
+
+def _changed_files(c, since):
+    """
+    Return the paths changed since a revision, untracked ones included,
+    relative to ROOT_DIR. None if git fails
+    """
+    diff = c.run(
+        f"git -C {ROOT_DIR} diff --name-only --relative {since} --",
+        hide=True,
+        warn=True,
+    )
+    untracked = c.run(
+        f"git -C {ROOT_DIR} ls-files --others --exclude-standard",
+        hide=True,
+        warn=True,
+    )
+    if diff.failed or untracked.failed:
+        return None
+    return set(diff.stdout.splitlines()) | set(untracked.stdout.splitlines())
+
+
+def _affected_tests(c, since):
+    """
+    Return the ids of the tests running the files changed since a revision,
+    None when the full suite must run
+    """
+    changed = _changed_files(c, since)
+    if changed is None:
+        raise Exit(f"Cannot list the files changed since {since}")
+    try:
+        test_map = json.loads(TEST_MAP.read_text())
+    except (OSError, ValueError):
+        print("No test map: run 'invoke coverage' to build it")
+        return None
+    revision = test_map["revision"]
+    # The coverage of the files changed since the map was built is outdated
+    outdated = _changed_files(c, revision) if revision else None
+    if outdated is None:
+        print("The test map is stale: run 'invoke coverage' to rebuild it")
+        return None
+    tests = set()
+    for path in sorted(changed | outdated):
+        if path in test_map["files"]:
+            if test_map["files"][path] is None:
+                print(f"{path} only runs at import time")
+                return None
+            tests.update(test_map["files"][path])
+        elif path.startswith("tests/") and Path(path).name.startswith("test_"):
+            # The whole test module: its tests may have been renamed
+            tests.add(path)
+        elif not path.endswith(NO_IMPACT_SUFFIXES):
+            print(f"{path} is not in the test map")
+            return None
+    return tests
+
+
+@task(
+    help={
+        'jobs': "Worker processes running shards of about the same duration,"
+                " from the durations of the previous runs (default: 1)",
+        'changed': "Only run the tests covering the files changed since a"
+                   " revision (default: HEAD), from the map of 'invoke"
+                   " coverage'",
+    },
+    optional=['changed'],
+)
+def test(c, jobs=1, changed=None):
     """
-    Build cythonizing
+    Run tests, in parallel shards balanced by the durations of the previous
+    runs with --jobs, only those covering the changed files with --changed
     """
     pty = platform.system() == 'Linux'
-    c.run("python {} build_ext --inplace".format(SETUP_FILE), pty=pty)
+    options = ""
+    if changed:
+        since = "HEAD" if changed is True else changed
+        selected = _affected_tests(c, since)
+        if selected is None:
+            print("Running the full suite")
+        elif not selected:
+            print(f"No tests affected by the changes since {since}")
+            return
+        else:
+            print(f"Running the tests affected by the changes since {since}")
+            TEST_SELECTION.write_text("\n".join(sorted(selected)) + "\n")
+            # One argument: pytest looks for conftest.py files under paths
+            options = f" --select-from={TEST_SELECTION}"
+    jobs = int(jobs)
+    if jobs <= 1:
+        c.run(f"pytest{options}", pty=pty)
+        return
+    # Merge the durations of the previous shards first: the shards balance
+    # on the merged ones, which none of them changes while they run
+    c.run(f"pytest --collect-only -q{options}", hide=True, warn=True)
+    workers = [
+        c.run(
+            f"pytest --color=yes --shard={index}/{jobs}{options}",
+            asynchronous=True,
+            hide=True,
+            warn=True,
+        )
+        for index in range(1, jobs + 1)
+    ]
+    failed = []
+    for index, worker in enumerate(workers, 1):
+        result = worker.join()
+        print(f"Shard {index}/{jobs}:")
+        print(result.stdout, end="")
+        # 5: the shard had no tests to run
+        if result.exited not in (0, 5):
+            failed.append(index)
+    if failed:
+        raise Exit(f"Shards failed: {', '.join(map(str, failed))}")
 
 
-@task
-def test(c):
+{%- if cookiecutter.use_benchmarks == "y" %}
+
+
+def _bench_timings(c, pattern, repeat, warmup):
+    """Run the benchmarks of the current directory, returning their timings"""
+    result = c.run(
+        f"python -m benchmarks {pattern} --json"
+        f" --repeat {repeat} --warmup {warmup}",
+        hide=True,
+    )
+    return {r["benchmark"]: r["timings"] for r in json.loads(result.stdout)}
+
+
+def _bench_compare(c, rev, pattern, repeat, warmup, rounds, threshold):
+    """
+    Run the benchmarks of the working tree against the code of rev, checked
+    out in a temporary worktree, alternating the two on every round
+    """
+    # The benchmarks are copied to the worktree of rev, where the package
+    # may lack modules: the harness only depends on itself
+    from benchmarks.harness import (
+        bootstrap_change,
+        format_time,
+        percentile,
+        verdict,
+    )
+
+    worktree = Path(tempfile.mkdtemp(prefix="bench-"))
+    try:
+        c.run(f"git worktree add --detach {worktree} {rev}", hide=True)
+        # Same benchmarks on both sides: only the code under test differs
+        shutil.rmtree(worktree.joinpath("benchmarks"), ignore_errors=True)
+        shutil.copytree(BENCHMARKS_DIR, worktree.joinpath("benchmarks"))
+{%- if cookiecutter.compiler_backend != "none" %}
+        with c.cd(str(worktree)):
+            c.run("invoke build", hide=True)
+{%- endif %}
+
+        samples = {"baseline": {}, "current": {}}
+        for i in range(int(rounds)):
+            # ABBA ordering cancels out linear drifts of the machine
+            sides = ["baseline", "current"]
+            for side in sides if i % 2 == 0 else reversed(sides):
+                directory = worktree if side == "baseline" else ROOT_DIR
+                with c.cd(str(directory)):
+                    timings = _bench_timings(c, pattern, repeat, warmup)
+                # The fastest repeat is the least disturbed by the machine
+                for name, seconds in timings.items():
+                    samples[side].setdefault(name, []).append(min(seconds))
+    finally:
+        c.run(f"git worktree remove --force {worktree}", hide=True, warn=True)
+        shutil.rmtree(worktree, ignore_errors=True)
+
+    print(f"{'benchmark':30} {rev:>10} {'current':>10} {'change':>8}  95% CI")
+    regressions = []
+    for name in sorted(set(samples["baseline"]) & set(samples["current"])):
+        baseline = samples["baseline"][name]
+        current = samples["current"][name]
+        # Rounds are paired, so that slow phases of the machine cancel out
+        change, low, high = bootstrap_change(baseline, current)
+        medians = [format_time(percentile(s, 50)) for s in (baseline, current)]
+        judged = verdict(change, low, high, float(threshold), len(baseline))
+        if judged == "SLOWER":
+            regressions.append(name)
+        print(
+            f"{name:30} {medians[0]:>10} {medians[1]:>10} {change:>+8.1%}"
+            f"  [{low:+.1%}, {high:+.1%}] {judged}"
+        )
+    if regressions:
+        raise Exit(f"Significant regressions over {float(threshold):.0%}: "
+                   + ", ".join(regressions))
+
+
+@task(help={
+    'pattern': "Regex selecting the benchmarks to run",
+    'repeat': "Timed repeats of each benchmark",
+    'warmup': "Untimed repeats run before timing",
+    'no_history': "Do not append the results to .benchmarks/history.jsonl",
+    'compare': "Git revision to compare the working tree against",
+    'rounds': "Alternated runs of each side when comparing, at least 10 for a"
+              " verdict",
+    'threshold': "Relative slowdown failing the comparison, e.g. 0.03 for 3%",
+})
+def bench(c, pattern="", repeat=20, warmup=3, no_history=False, compare="",
+          rounds=30, threshold=0.03):
     """
-    Run tests
+    Run benchmarks, or compare them with another revision
     """
+    if compare:
+        _bench_compare(c, compare, pattern, repeat, warmup, rounds, threshold)
+        return
     pty = platform.system() == 'Linux'
-    c.run("pytest", pty=pty)
+    options = [
+        f"--repeat {repeat}",
+        f"--warmup {warmup}",
+        "--no-history" if no_history else "",
+    ]
+    c.run(f"python -m benchmarks {pattern} {' '.join(options)}", pty=pty)
+{%- endif %}
+
+
+@task(help={
+    'repeat': "Runs per target, the fastest one is reported",
+    'min_ms': "Hide modules importing faster than this",
+})
+def importtime(c, repeat=5, min_ms=1.0):
+    """
+    Check import times against the budgets in setup.cfg (Python 3.7+)
+    """
+    total_ms, module_ms, module_budgets = _importtime_budgets()
+    targets = {
+        "import {{ cookiecutter.project_slug }}": "-c 'import {{ cookiecutter.project_slug }}'",
+        # Without a command, python -m {{ cookiecutter.project_slug }} exits with 1: --complete
+        # lists the commands through the same dispatcher and exits with 0
+        "python -m {{ cookiecutter.project_slug }}": "-m {{ cookiecutter.project_slug }} --complete",
+    }
+    failures = []
+    for target, args in targets.items():
+        total_us, roots = _measure_imports(c, args, int(repeat))
+        print(f"{target}: {total_us / 1000:.1f} ms (budget {total_ms} ms)")
+        if total_us / 1000 > total_ms:
+            failures.append(f"{target} takes {total_us / 1000:.1f} ms")
+        for depth, node in _walk_imports(roots):
+            node_ms = node.cumulative_us / 1000
+            budget = module_budgets.get(node.name, module_ms)
+            if node_ms > budget:
+                failures.append(f"{node.name} takes {node_ms:.1f} ms")
+            if node_ms >= float(min_ms):
+                print(f"{node_ms:10.1f} ms  {'  ' * depth}{node.name}")
+    if failures:
+        raise Exit("Import time over budget:\n" + "\n".join(failures))
+
+
+@task(help={
+    'command': "Command of 'python -m {{ cookiecutter.project_slug }}' with its arguments, quoted,"
+               " or the pytest arguments with --pytest",
+    'pytest': "Profile a pytest selection instead of a command",
+    'mode': "deterministic (cProfile), sampling, or both (default)",
+    'interval': "Sampling interval in seconds (default: 0.001)",
+    'top': "Rows of the hot function tables (default: 20)",
+})
+def profile(c, command, pytest=False, mode="both", interval=0.001, top=20):
+    """
+    Profile a command, writing hot function tables, cProfile .prof files and
+    collapsed stacks for flamegraphs to .profiles/
+    """
+    modes = PROFILE_MODES if mode == "both" else [mode]
+    if not set(modes) <= set(PROFILE_MODES):
+        raise Exit(f"Unknown mode {mode}, use one of {PROFILE_MODES} or both")
+    for mode in modes:
+        c.run(
+            f"python -m {{ cookiecutter.project_slug }}._profiling --mode {mode}"
+            f" --interval {interval} --top {top} --output {PROFILES_DIR}"
+            f"{' --pytest' if pytest else ''} -- {command}",
+            pty=platform.system() == 'Linux',
+        )
+
+
+@task(help={
+    'command': "Command of 'python -m {{ cookiecutter.project_slug }}' with its arguments, quoted,"
+               " or the pytest arguments with --pytest",
+    'pytest': "Profile a pytest selection instead of a command",
+    'top': "Rows of the allocation site tables (default: 10)",
+    'frames': "Frames of the tracebacks of allocations (default: 10)",
+})
+def memprofile(c, command, pytest=False, top=10, frames=10):
+    """
+    Trace the memory allocations of a command: peak, top allocation sites
+    and differences with the previous run, written to .profiles/
+    """
+    c.run(
+        f"python -m {{ cookiecutter.project_slug }}._memprofile --top {top} --frames {frames}"
+        f" --output {PROFILES_DIR}{' --pytest' if pytest else ''} -- {command}",
+        pty=platform.system() == 'Linux',
+    )
+
+
+def _test_map():
+    """
+    Map each source file run by the tests to the ids of the tests running
+    it, or to None when it only runs at import time (out of any test)
+    """
+    from coverage import CoverageData
+
+    data = CoverageData(basename=str(COVERAGE_FILE))
+    data.read()
+    files = {}
+    for path in data.measured_files():
+        contexts = set()
+        for line_contexts in data.contexts_by_lineno(path).values():
+            contexts.update(line_contexts)
+        if not contexts:
+            continue
+        # The empty context: collection and imports, set by tests/conftest.py
+        tests = sorted(contexts - {""})
+        name = Path(path).resolve().relative_to(ROOT_DIR.resolve())
+        files[name.as_posix()] = tests or None
+    return files
 
 
 @task(help={'publish': "Publish the result via coveralls"})
 def coverage(c, publish=False):
     """
-    Create coverage report
+    Create coverage report, and the test map of 'invoke test --changed'
     """
     c.run("coverage run --source {} -m pytest".format(SOURCE_DIR))
+    revision = c.run(f"git -C {ROOT_DIR} rev-parse HEAD", hide=True, warn=True)
+    TEST_IMPACT_DIR.mkdir(exist_ok=True)
+    TEST_MAP.write_text(json.dumps({
+        "revision": revision.stdout.strip() if revision.ok else None,
+        "files": _test_map(),
+    }, indent=1))
     c.run("coverage report")
     if publish:
         # Publish the results via coveralls
@@ -161,9 +670,13 @@ def clean_build(c):
     c.run("rm -fr .eggs/")
     c.run("find . -name '*.egg-info' -exec rm -fr {} +")
     c.run("find . -name '*.egg' -exec rm -f {} +")
-    c.run(" ".join([f"find {SOURCE_DIR} - name '*.c'", "-exec rm -f {} +"]))
-    c.run(" ".join([f"find {SOURCE_DIR} - name '*.cpp'", "-exec rm -f {} +"]))
-    c.run(" ".join([f"find {SOURCE_DIR} - name '*.so'", "-exec rm -f {} +"]))
+    c.run(" ".join([f"find {SOURCE_DIR} -name '*.c'", "-exec rm -f {} +"]))
+    c.run(" ".join([f"find {SOURCE_DIR} -name '*.cpp'", "-exec rm -f {} +"]))
+    c.run(" ".join([f"find {SOURCE_DIR} -name '*.so'", "-exec rm -f {} +"]))
+{%- if cookiecutter.compiler_backend == "mypyc" %}
+    # The runtime library shared by the modules compiled by mypyc
+    c.run("find . -maxdepth 1 -name '*__mypyc*' -exec rm -f {} +")
+{%- endif %}
 
 
 @task
@@ -184,6 +697,7 @@ def clean_tests(c):
     """
     _delete_file(COVERAGE_FILE)
     shutil.rmtree(COVERAGE_DIR, ignore_errors=True)
+    shutil.rmtree(TEST_IMPACT_DIR, ignore_errors=True)
 
 
 @task(pre=[clean_build, clean_python, clean_tests, clean_docs])
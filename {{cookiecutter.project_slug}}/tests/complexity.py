@@ -0,0 +1,174 @@
+"""
+Empirical complexity of hot functions, to catch accidental quadratic code
+that a fixed-size benchmark never shows::
+
+    from tests.complexity import assert_complexity
+
+    def test_parse_scales():
+        assert_complexity(parse, lambda n: "x," * n, expected="n log n")
+
+The function runs on inputs of a geometric series of sizes. Its timings at
+the largest sizes are fitted to each complexity class as ``a + b * f(n)``,
+minimising relative errors so that every size counts. The fitted class is
+the simplest one fitting about as well as the best one: the assertion
+fails when it grows faster than the expected one, measured again first.
+The test is skipped when too few sizes fit in the time budget.
+"""
+import math
+import time
+
+import pytest
+
+COMPLEXITIES = {
+    "1": lambda n: 1.0,
+    "log n": math.log,
+    "n": float,
+    "n log n": lambda n: n * math.log(n),
+    "n^2": lambda n: float(n) ** 2,
+}
+ALIASES = {"logn": "log n", "nlogn": "n log n", "n**2": "n^2", "n²": "n^2"}
+# Shortest timing of a loop of calls
+MIN_SECONDS = 0.002
+# The lower order terms of the timings fade away at the largest sizes
+FIT_SIZES = 5
+# Fewest sizes telling a + b * f(n) apart from the other classes
+MIN_SIZES = 4
+# A simpler class fits as well as the best one within FIT_MARGIN times its
+# relative error, or within the NOISE of the timings
+FIT_MARGIN = 1.5
+NOISE = 0.05
+
+
+def complexity_class(name):
+    """Normalise a complexity: 'O(n log n)', 'nlogn' or 'n log n'"""
+    name = name.strip()
+    if name.startswith("O(") and name.endswith(")"):
+        name = name[2:-1]
+    name = " ".join(name.split())
+    name = ALIASES.get(name.replace(" ", ""), name)
+    if name not in COMPLEXITIES:
+        raise ValueError(
+            "Unknown complexity {!r}, use one of {}".format(
+                name, list(COMPLEXITIES)
+            )
+        )
+    return name
+
+
+def _residual(sizes, timings, f):
+    """
+    Fit timings to a + b * f(n), b >= 0, minimising relative errors.
+    Return the root mean square relative error
+    """
+    weights = [1 / t ** 2 for t in timings]
+    xs = [f(n) for n in sizes]
+    total = sum(weights)
+    mean_x = sum(w * x for w, x in zip(weights, xs)) / total
+    mean_t = sum(w * t for w, t in zip(weights, timings)) / total
+    variance = sum(w * (x - mean_x) ** 2 for w, x in zip(weights, xs))
+    if variance > 0:
+        covariance = sum(
+            w * (x - mean_x) * (t - mean_t)
+            for w, x, t in zip(weights, xs, timings)
+        )
+        slope = max(covariance / variance, 0.0)
+    else:
+        slope = 0.0
+    intercept = mean_t - slope * mean_x
+    errors = [(t - intercept - slope * x) / t for x, t in zip(xs, timings)]
+    return math.sqrt(sum(e ** 2 for e in errors) / len(errors))
+
+
+def fit_complexity(sizes, timings):
+    """
+    Return the fitted class of timings by size, with the residual of each
+    class
+    """
+    residuals = {
+        name: _residual(sizes, timings, f)
+        for name, f in COMPLEXITIES.items()
+    }
+    best = min(residuals.values())
+    for name in COMPLEXITIES:
+        if residuals[name] <= max(best * FIT_MARGIN, NOISE):
+            return name, residuals
+
+
+def _time(function, data, number):
+    start = time.process_time()
+    for _ in range(number):
+        function(data)
+    return time.process_time() - start
+
+
+def measure(function, make_input, sizes, repeat=5, max_seconds=0.1):
+    """
+    Return the sizes measured and the fastest of repeat timings of
+    function(make_input(n)) for each, stopping after the size whose
+    repeat timings took longer than max_seconds in total. The timings are
+    in CPU time, which other processes loading the machine do not stretch.
+    Fast calls are looped over the same input for MIN_SECONDS: function
+    must not change its input
+    """
+    measured, timings = [], []
+    for n in sizes:
+        data = make_input(n)
+        number = 1
+        while _time(function, data, number) < MIN_SECONDS:
+            number *= 2
+        # Neither building the inputs nor calibrating counts
+        inputs = [make_input(n) for _ in range(repeat)]
+        elapsed = [_time(function, data, number) for data in inputs]
+        measured.append(n)
+        timings.append(min(elapsed) / number)
+        if sum(elapsed) > max_seconds:
+            break
+    return measured, timings
+
+
+def assert_complexity(
+    function,
+    make_input,
+    expected,
+    sizes=None,
+    repeat=5,
+    max_seconds=0.1,
+    retries=1,
+):
+    """
+    Fail when function(make_input(n)) grows faster with n than expected:
+    '1', 'log n', 'n', 'n log n' or 'n^2', in 1 + retries measures. sizes
+    default to 256 to 32768, doubling. Return the fitted class, skipping
+    the test when less than MIN_SIZES sizes were measured in max_seconds
+    """
+    expected = complexity_class(expected)
+    sizes = sizes or [2 ** k for k in range(8, 16)]
+    names = list(COMPLEXITIES)
+    for _ in range(retries + 1):
+        measured, timings = measure(
+            function, make_input, sizes, repeat, max_seconds
+        )
+        if len(measured) < MIN_SIZES:
+            pytest.skip(
+                "Only {} sizes measured in {} s: use smaller sizes".format(
+                    len(measured), max_seconds
+                )
+            )
+        fitted, residuals = fit_complexity(
+            measured[-FIT_SIZES:], timings[-FIT_SIZES:]
+        )
+        if names.index(fitted) <= names.index(expected):
+            return fitted
+    lines = [
+        "{} grows as O({}), expected O({})".format(
+            getattr(function, "__name__", function), fitted, expected
+        )
+    ]
+    lines += [
+        "{:>10} {:12.3g} s".format(n, t) for n, t in zip(measured, timings)
+    ]
+    lines += [
+        "O({}) relative error {:.3f}".format(name, residual)
+        for name, residual in residuals.items()
+    ]
+    raise AssertionError("\n".join(lines))
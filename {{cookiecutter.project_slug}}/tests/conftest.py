@@ -1,8 +1,424 @@
+import argparse
+import functools
+import json
+import math
+import os
+import re
+import time
+import tracemalloc
+import warnings
+from pathlib import Path
+
 import pytest
 
+{% if cookiecutter.compiler_backend == "cython" -%}
+from {{ cookiecutter.project_slug }} import speedups
+{% endif -%}
+from {{ cookiecutter.project_slug }}._memprofile import (
+    format_size,
+    parse_size,
+    reset_peak,
+)
+
+
+# Durations of the tests, recorded under .pytest_cache to balance shards.
+# Each shard of a parallel run writes its own file: no concurrent writes.
+# The shards balance on ALL_DURATIONS alone, which none of them changes, so
+# that all of them split the tests the same way
+DURATIONS_DIR = "durations"
+ALL_DURATIONS = "all.json"
+RECORDED = {}
+# Runs of a latency measure: as many as fit in LATENCY_SECONDS, from the
+# duration of a first untimed call, within LATENCY_RUNS
+LATENCY_SECONDS = 0.5
+LATENCY_RUNS = (20, 1000)
+LATENCY_BUDGET = re.compile(r"^p(\d+)_ms$")
+LATENCIES = {}
+
+
+def parse_shard(value):
+    """Parse a 'i/N' shard specification, with 1 <= i <= N"""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "shard must be in the form i/N, got {!r}".format(value)
+        )
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(
+            "shard index must be between 1 and {}, got {}".format(count, index)
+        )
+    return index, count
+
 
 def pytest_addoption(parser):
     parser.addoption("--slow", action="store_true", help="include slow tests")
+    parser.addoption(
+        "--shard",
+        type=parse_shard,
+        default=None,
+        metavar="i/N",
+        help="run the i-th of N shards balanced by recorded durations",
+    )
+    parser.addoption(
+        "--select-from",
+        default=None,
+        metavar="PATH",
+        help="only run the tests, or test modules, whose ids PATH lists",
+    )
+    parser.addoption(
+        "--latency-tolerance",
+        type=float,
+        default=0.0,
+        metavar="FRACTION",
+        help="relative excess over latency budgets to tolerate, e.g. 0.5",
+    )
+    parser.addoption(
+        "--latency-retries",
+        type=int,
+        default=0,
+        metavar="N",
+        help="measures to retry before failing a latency budget",
+    )
+    parser.addoption(
+        "--latency-report-only",
+        action="store_true",
+        help="report latency budgets exceeded without failing",
+    )
+
+
+def _durations_dir(config):
+    """Return the directory of the durations, None without a pytest cache"""
+    cache = getattr(config, "cache", None)
+    if cache is None:
+        return None
+    # Cache.makedir was renamed mkdir in pytest 7
+    mkdir = getattr(cache, "mkdir", None) or cache.makedir
+    return Path(str(mkdir(DURATIONS_DIR)))
+
+
+def _write_json(path, data):
+    """Write data to path atomically, for the processes reading it"""
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data))
+    os.replace(str(tmp), str(path))
+
+
+def read_durations(config, shards=True):
+    """
+    Return the recorded seconds of each test id, the latest one wins, only
+    from ALL_DURATIONS without shards
+    """
+    directory = _durations_dir(config)
+    if directory is None:
+        return {}
+    durations = {}
+    pattern = "*.json" if shards else ALL_DURATIONS
+    files = sorted(directory.glob(pattern), key=lambda p: p.stat().st_mtime)
+    for path in files:
+        try:
+            durations.update(json.loads(path.read_text()))
+        except ValueError:
+            continue
+    return durations
+
+
+def balance(items, durations, count):
+    """
+    Split items into count shards of about the same total duration: the
+    longest first, each to the least loaded shard. Tests without a recorded
+    duration count for the median one. Each shard keeps the collection
+    order, so that module and class fixtures are set up once
+    """
+    known = sorted(durations.values())
+    default = known[len(known) // 2] if known else 1.0
+    # Stable: the collection order breaks ties
+    ordered = sorted(items, key=lambda i: -durations.get(i.nodeid, default))
+    loads = [0.0] * count
+    shards = [[] for _ in range(count)]
+    for item in ordered:
+        lightest = loads.index(min(loads))
+        loads[lightest] += durations.get(item.nodeid, default)
+        shards[lightest].append(item)
+    # Items may not be hashable
+    position = {id(item): n for n, item in enumerate(items)}
+    return [sorted(shard, key=lambda i: position[id(i)]) for shard in shards]
+
+
+def select(items, ids):
+    """Keep the items listed in ids, by test id or by module path"""
+    return [
+        item
+        for item in items
+        if item.nodeid in ids or item.nodeid.split("::")[0] in ids
+    ]
+
+
+def _deselect(config, items, selected):
+    chosen = set(selected)
+    config.hook.pytest_deselected(
+        items=[item for item in items if item not in chosen]
+    )
+    items[:] = selected
+
+
+def pytest_collection_modifyitems(config, items):
+    select_from = config.getoption("--select-from")
+    if select_from is not None:
+        ids = set(Path(select_from).read_text().splitlines())
+        _deselect(config, items, select(items, ids))
+    shard = config.getoption("--shard")
+    if shard is not None:
+        index, count = shard
+        shards = balance(items, read_durations(config, shards=False), count)
+        _deselect(config, items, shards[index - 1])
+
+
+def _coverage_context(name):
+    """Attribute the lines run from now on to name, under 'coverage run'"""
+    try:
+        from coverage import Coverage
+    except ImportError:
+        return
+    current = Coverage.current()
+    if current is not None:
+        current.switch_context(name)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item):
+    # The per-test contexts of the test map of 'invoke test --changed'
+    _coverage_context(item.nodeid)
+    yield
+    _coverage_context("")
+
+
+def pytest_runtest_logreport(report):
+    # Setup, call and teardown
+    RECORDED[report.nodeid] = RECORDED.get(report.nodeid, 0) + report.duration
+
+
+def pytest_sessionfinish(session):
+    directory = _durations_dir(session.config)
+    if directory is None:
+        return
+    shard = session.config.getoption("--shard")
+    if shard is not None:
+        if RECORDED:
+            path = directory.joinpath("shard-{}-of-{}.json".format(*shard))
+            _write_json(path, RECORDED)
+        return
+    # Also without any test run, e.g. --collect-only before starting shards
+    durations = read_durations(session.config)
+    durations.update(RECORDED)
+    _write_json(directory.joinpath(ALL_DURATIONS), durations)
+    # Merged into ALL_DURATIONS
+    for path in directory.glob("shard-*.json"):
+        path.unlink()
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers",
+        "max_memory(size): fail when the peak of the memory traced while the"
+        " test runs exceeds size, e.g. '200MB'",
+    )
+    config.addinivalue_line(
+        "markers",
+        "latency(p95_ms=...): run the test many times and fail when a"
+        " percentile of its duration exceeds its budget in milliseconds",
+    )
+
+
+def within_memory_budget(function, budget):
+    """
+    Wrap a test function to fail when the peak of the memory traced while it
+    runs exceeds budget bytes. Under 'invoke memprofile' before Python 3.9,
+    the peak cannot be reset and the budget is not checked
+    """
+
+    @functools.wraps(function)
+    def test(*args, **kwargs):
+        tracing = tracemalloc.is_tracing()
+        # Under 'invoke memprofile', which keeps the peak of the run
+        if tracing and not reset_peak():
+            warnings.warn(
+                "max_memory not checked: tracemalloc cannot reset the peak"
+                " of the traced memory before Python 3.9"
+            )
+            return function(*args, **kwargs)
+        if not tracing:
+            tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        try:
+            result = function(*args, **kwargs)
+            peak = tracemalloc.get_traced_memory()[1] - start
+        finally:
+            if not tracing:
+                tracemalloc.stop()
+        if peak > budget:
+            pytest.fail(
+                "Peak traced memory {} over the budget of {}".format(
+                    format_size(peak), format_size(budget)
+                ),
+                pytrace=False,
+            )
+        return result
+
+    return test
+
+
+def latency_budgets(**budgets):
+    """Map the percentiles of pNN_ms keyword arguments to their budgets"""
+    if not budgets:
+        raise ValueError("No latency budget: pNN_ms")
+    percentiles = {}
+    for name, milliseconds in budgets.items():
+        match = LATENCY_BUDGET.match(name)
+        if not match or not 0 < int(match.group(1)) <= 100:
+            raise ValueError("Invalid latency budget {}: pNN_ms".format(name))
+        percentiles[int(match.group(1))] = float(milliseconds)
+    return percentiles
+
+
+def percentile(samples, p):
+    """Return the nearest-rank p-th percentile of sorted samples"""
+    return samples[max(math.ceil(p / 100 * len(samples)), 1) - 1]
+
+
+def measure_latency(function, args, kwargs, percentiles):
+    """
+    Call function a calibrated number of times, returning the runs and the
+    percentiles of their durations in milliseconds
+    """
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    first = time.perf_counter() - start
+    low, high = LATENCY_RUNS
+    runs = min(max(int(LATENCY_SECONDS / max(first, 1e-9)), low), high)
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function(*args, **kwargs)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return runs, {p: percentile(samples, p) * 1000 for p in percentiles}
+
+
+def within_latency_budget(
+    function,
+    budgets,
+    tolerance=0.0,
+    retries=0,
+    report_only=False,
+    record=None,
+):
+    """
+    Wrap a test function to fail when a percentile of its durations exceeds
+    its budget in milliseconds, more than tolerance relatively, in 1 +
+    retries measures. The wrapper passes the measure kept to record. The
+    test is called up to 1000 times with the same fixture instances, so it
+    must not change them
+    """
+
+    @functools.wraps(function)
+    def test(*args, **kwargs):
+        for attempt in range(1, retries + 2):
+            runs, measured = measure_latency(function, args, kwargs, budgets)
+            limit = 1 + tolerance
+            over = [p for p in budgets if measured[p] > budgets[p] * limit]
+            if not over:
+                break
+        if record is not None:
+            record({
+                "budgets": budgets,
+                "measured": measured,
+                "runs": runs,
+                "attempts": attempt,
+                "over": over,
+            })
+        if over and not report_only:
+            exceeded = ", ".join(
+                "p{} {:.3g} ms > {:g} ms".format(p, measured[p], budgets[p])
+                for p in over
+            )
+            pytest.fail(
+                "Latency over budget after {} measures of {} runs: {}".format(
+                    attempt, runs, exceeded
+                ),
+                pytrace=False,
+            )
+
+    return test
+
+
+def record_latency(nodeid, result):
+    """Keep a latency measure for the summary of the session"""
+    LATENCIES.setdefault(nodeid, []).append(result)
+
+
+def invalid_marker(function, marker, error):
+    """
+    Wrap a test function to fail with the error of its marker, instead of
+    interrupting the collection
+    """
+
+    @functools.wraps(function)
+    def test(*args, **kwargs):
+        pytest.fail(
+            "Invalid {} marker: {}".format(marker.name, error), pytrace=False
+        )
+
+    return test
+
+
+def pytest_itemcollected(item):
+    if not isinstance(item, pytest.Function):
+        return
+    marker = item.get_closest_marker("max_memory")
+    if marker is not None:
+        try:
+            budget = parse_size(*marker.args)
+        except (TypeError, ValueError) as e:
+            item.obj = invalid_marker(item.obj, marker, e)
+        else:
+            item.obj = within_memory_budget(item.obj, budget)
+    marker = item.get_closest_marker("latency")
+    if marker is not None:
+        try:
+            budgets = latency_budgets(**marker.kwargs)
+        except (TypeError, ValueError) as e:
+            item.obj = invalid_marker(item.obj, marker, e)
+        else:
+            item.obj = within_latency_budget(
+                item.obj,
+                budgets,
+                tolerance=item.config.getoption("--latency-tolerance"),
+                retries=item.config.getoption("--latency-retries"),
+                report_only=item.config.getoption("--latency-report-only"),
+                record=functools.partial(record_latency, item.nodeid),
+            )
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not LATENCIES:
+        return
+    terminalreporter.section("latency budgets")
+    for nodeid, results in LATENCIES.items():
+        for result in results:
+            percentiles = ", ".join(
+                "p{} {:.3g}/{:g} ms".format(p, result["measured"][p], budget)
+                for p, budget in sorted(result["budgets"].items())
+            )
+            terminalreporter.write_line(
+                "{:4} {}: {} ({} runs, attempt {})".format(
+                    "OVER" if result["over"] else "ok",
+                    nodeid,
+                    percentiles,
+                    result["runs"],
+                    result["attempts"],
+                )
+            )
 
 
 def pytest_runtest_setup(item):
@@ -11,4 +427,18 @@ def pytest_runtest_setup(item):
 
     for opt in ["slow"]:
         if opt in item.keywords and not getopt(opt):
-            pytest.skip("need --%s option to run" % opt)
\ No newline at end of file
+            pytest.skip("need --%s option to run" % opt)
+{%- if cookiecutter.compiler_backend == "cython" %}
+
+
+@pytest.fixture(autouse=True, params=speedups.IMPLEMENTATIONS)
+def implementation(request):
+    """Run every test against both the compiled and pure-Python speedups"""
+    previous = speedups.IMPLEMENTATION
+    try:
+        speedups.use(request.param)
+    except ImportError:
+        pytest.skip("compiled speedups not built, run 'invoke build'")
+    yield request.param
+    speedups.use(previous)
+{%- endif %}
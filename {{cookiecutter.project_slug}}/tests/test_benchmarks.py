@@ -0,0 +1,63 @@
+import pytest
+
+from benchmarks import harness
+
+
+def test_percentile():
+    values = [4, 1, 3, 2, 5]
+    assert harness.percentile(values, 0) == 1
+    assert harness.percentile(values, 50) == 3
+    assert harness.percentile(values, 100) == 5
+    assert harness.percentile(values, 25) == 2
+    assert harness.percentile([1, 2], 50) == 1.5
+
+
+def test_measure():
+    loops, timings = harness.measure(lambda: None, repeat=3, min_time=0.001)
+    assert loops >= 1
+    assert len(timings) == 3
+    assert all(timing > 0 for timing in timings)
+
+
+def test_bootstrap_change():
+    baseline = [1.0, 1.01, 0.99, 1.02, 0.98] * 4
+    change, low, high = harness.bootstrap_change(baseline, baseline)
+    assert change == 0
+    assert low <= 0 <= high
+
+    slower = [t * 1.2 for t in baseline]
+    change, low, high = harness.bootstrap_change(baseline, slower)
+    assert change == pytest.approx(0.2)
+    assert low == pytest.approx(0.2)
+    assert high == pytest.approx(0.2)
+
+    noisy = [t * r for t, r in zip(slower, [1.01, 0.99, 1.02, 0.98] * 5)]
+    change, low, high = harness.bootstrap_change(baseline, noisy)
+    assert 0.15 < low <= change <= high < 0.25
+
+
+def test_verdict():
+    pairs = harness.MIN_PAIRS
+    assert harness.verdict(0.1, 0.09, 0.11, 0.03, pairs) == "SLOWER"
+    assert harness.verdict(-0.1, -0.11, -0.09, 0.03, pairs) == "faster"
+    assert harness.verdict(0.01, 0.005, 0.015, 0.03, pairs) == ""
+    for change, low, high, pairs in [
+        (0.1, -0.01, 0.2, pairs),
+        (0.1, 0.01, 0.2, pairs),
+        (0.1, 0.09, 0.11, 4),
+    ]:
+        assert (
+            harness.verdict(change, low, high, 0.03, pairs)
+            == "no significant change"
+        )
+
+
+@pytest.mark.parametrize(
+    "seconds, text", [(2, "2 s"), (0.0015, "1.5 ms"), (3e-8, "30 ns")]
+)
+def test_format_time(seconds, text):
+    assert harness.format_time(seconds) == text
+
+
+def test_benchmarks_are_discovered():
+    assert harness.discover()
@@ -0,0 +1,95 @@
+import os.path
+import pstats
+
+import pytest
+
+from {{ cookiecutter.project_slug }} import __main__, _commands
+
+
+@pytest.fixture()
+def registry(monkeypatch, tmp_path):
+    monkeypatch.setattr(_commands, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(
+        _commands, "INDEX_FILE", str(tmp_path.joinpath("commands.json"))
+    )
+    monkeypatch.setattr(
+        _commands, "COMMANDS", {"hello": "not_an_imported_module:main"}
+    )
+    return _commands
+
+
+def test_listing_imports_no_command(registry):
+    assert registry.complete() == ["hello"]
+    assert registry.complete("he") == ["hello"]
+    assert registry.complete("x") == []
+
+
+def test_entry_points_are_cached(registry, monkeypatch):
+    scans = []
+
+    def entry_points():
+        scans.append(1)
+        return {"world": "os.path:join"}
+
+    monkeypatch.setattr(registry, "_entry_points", entry_points)
+    assert registry.command_index()["world"] == "os.path:join"
+    assert registry.command_index()["world"] == "os.path:join"
+    assert len(scans) == 1
+
+
+def test_index_ignores_the_cwd(registry, monkeypatch, tmp_path):
+    scans = []
+
+    def entry_points():
+        scans.append(1)
+        return {}
+
+    monkeypatch.setattr(registry, "_entry_points", entry_points)
+    monkeypatch.chdir(tmp_path)
+    # The working directory, first on sys.path under 'python -m'
+    monkeypatch.syspath_prepend("")
+    registry.command_index()
+    tmp_path.joinpath("new_file").touch()
+    registry.command_index()
+    assert len(scans) == 1
+    # Without temporary files left behind
+    assert sorted(os.listdir(str(tmp_path))) == ["commands.json", "new_file"]
+
+
+def test_load_command():
+    assert _commands.load_command("os.path:join") is os.path.join
+
+
+def test_global_flags():
+    args = ["--timings", "--profile=out.prof", "hello", "--timings"]
+    assert __main__._global_flags(args) == (True, "out.prof")
+    assert args == ["hello", "--timings"]
+
+    args = ["--profile", "out.collapsed", "--complete"]
+    assert __main__._global_flags(args) == (False, "out.collapsed")
+    assert args == ["--complete"]
+
+
+def test_unknown_global_flag():
+    with pytest.raises(SystemExit):
+        __main__._global_flags(["--bogus", "hello"])
+
+
+def test_instrument_measures_the_body(tmp_path):
+    def command(name: str = "world"):
+        return sorted(range(1000))
+
+    path = str(tmp_path.joinpath("command.prof"))
+    body, measures = __main__._instrument(command, path)
+    assert body.__wrapped__ is command
+    assert body() == list(range(1000))
+    assert set(measures) == {"wall", "cpu"}
+    functions = {name for _, _, name in pstats.Stats(path).stats}
+    assert "command" in functions
+
+
+def test_instrument_samples_stacks(tmp_path):
+    path = tmp_path.joinpath("command.collapsed")
+    body, _ = __main__._instrument(lambda: None, str(path))
+    body()
+    assert path.exists()
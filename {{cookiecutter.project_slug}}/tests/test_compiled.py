@@ -0,0 +1,40 @@
+"""
+Once built, exactly the modules listed in the [mypyc] section of setup.cfg
+are loaded compiled
+"""
+import configparser
+import importlib
+import importlib.machinery
+import pkgutil
+from pathlib import Path
+
+import pytest
+
+import {{ cookiecutter.project_slug }}
+
+SETUP_CFG = Path(__file__).parents[1].joinpath("setup.cfg")
+
+
+def listed_modules():
+    config = configparser.ConfigParser()
+    config.read(SETUP_CFG)
+    paths = config.get("mypyc", "modules").split()
+    return {".".join(Path(path).with_suffix("").parts) for path in paths}
+
+
+def is_compiled(module):
+    suffixes = tuple(importlib.machinery.EXTENSION_SUFFIXES)
+    return module.__file__.endswith(suffixes)
+
+
+def test_listed_modules_are_compiled():
+    modules = [
+        importlib.import_module(info.name)
+        for info in pkgutil.walk_packages(
+            {{ cookiecutter.project_slug }}.__path__, "{{ cookiecutter.project_slug }}."
+        )
+    ]
+    compiled = {module.__name__ for module in modules if is_compiled(module)}
+    if not compiled:
+        pytest.skip("modules not compiled, run 'invoke build'")
+    assert compiled == listed_modules()
@@ -0,0 +1,49 @@
+import pytest
+
+from tests.complexity import (
+    assert_complexity,
+    complexity_class,
+    fit_complexity,
+)
+
+SIZES = [2 ** k for k in range(6, 13)]
+
+
+def prepend_all(items):
+    """Quadratic: copy the list built so far for each item"""
+    result = []
+    for item in items:
+        result = [item] + result
+    return result
+
+
+def test_complexity_class():
+    assert complexity_class("O(n log n)") == "n log n"
+    assert complexity_class("nlogn") == "n log n"
+    assert complexity_class("n**2") == "n^2"
+    with pytest.raises(ValueError):
+        complexity_class("n^3")
+
+
+def test_fit_exact_timings():
+    sizes = [2 ** k for k in range(8, 16)]
+    for name, timing in [
+        ("1", lambda n: 1e-6),
+        ("n", lambda n: 1e-6 + 1e-8 * n),
+        ("n^2", lambda n: 1e-6 + 1e-10 * n * n),
+    ]:
+        fitted, residuals = fit_complexity(sizes, [timing(n) for n in sizes])
+        assert fitted == name
+        assert residuals[name] < 1e-6
+
+
+def test_linear_function():
+    # n and n log n are hard to tell apart: declare the class to catch
+    assert_complexity(sum, lambda n: list(range(n)), "n log n", sizes=SIZES)
+
+
+def test_quadratic_function():
+    with pytest.raises(AssertionError, match=r"grows as O\(n\^2\)"):
+        assert_complexity(
+            prepend_all, lambda n: list(range(n)), "n log n", sizes=SIZES
+        )
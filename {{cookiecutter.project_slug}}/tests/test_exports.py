@@ -0,0 +1,27 @@
+import subprocess
+import sys
+
+import pytest
+
+import {{ cookiecutter.project_slug }}
+
+
+@pytest.mark.parametrize("name", {{ cookiecutter.project_slug }}._EXPORTS)
+def test_exports_are_lazy(name):
+    module_name = {{ cookiecutter.project_slug }}._EXPORTS[name].partition(":")[0]
+    code = (
+        "import sys, {{ cookiecutter.project_slug }}; "
+        f"assert '{{ cookiecutter.project_slug }}.{module_name}' not in sys.modules; "
+        f"{{ cookiecutter.project_slug }}.{name}; "
+        f"assert '{{ cookiecutter.project_slug }}.{module_name}' in sys.modules"
+    )
+    subprocess.check_call([sys.executable, "-c", code])
+
+
+def test_dir_lists_exports():
+    assert set({{ cookiecutter.project_slug }}._EXPORTS) <= set(dir({{ cookiecutter.project_slug }}))
+
+
+def test_unknown_attribute():
+    with pytest.raises(AttributeError):
+        {{ cookiecutter.project_slug }}.not_exported
@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+from tests.conftest import (
+    invalid_marker,
+    latency_budgets,
+    percentile,
+    within_latency_budget,
+)
+
+
+def sleep_ms(milliseconds):
+    time.sleep(milliseconds / 1000)
+
+
+def test_percentile():
+    samples = list(range(1, 101))
+    assert percentile(samples, 50) == 50
+    assert percentile(samples, 95) == 95
+    assert percentile(samples, 100) == 100
+    assert percentile([7], 99) == 7
+
+
+def test_latency_budgets():
+    assert latency_budgets(p50_ms=1, p95_ms=2.5) == {50: 1.0, 95: 2.5}
+    for name in ("p0_ms", "p101_ms", "p95", "mean_ms"):
+        with pytest.raises(ValueError):
+            latency_budgets(**{name: 1})
+    with pytest.raises(ValueError):
+        latency_budgets()
+
+
+def test_invalid_marker():
+    marker = pytest.mark.latency(p95=5).mark
+    try:
+        latency_budgets(**marker.kwargs)
+    except ValueError as e:
+        test = invalid_marker(sleep_ms, marker, e)
+    with pytest.raises(pytest.fail.Exception, match="Invalid latency marker"):
+        test(1)
+
+
+def test_latency_over_budget():
+    results = []
+    test = within_latency_budget(
+        sleep_ms, {95: 0.1}, retries=1, record=results.append
+    )
+    with pytest.raises(pytest.fail.Exception, match="p95 .* > 0.1 ms"):
+        test(1)
+    [result] = results
+    assert result["over"] == [95]
+    assert result["attempts"] == 2
+    assert result["runs"] >= 20
+
+
+def test_latency_tolerance_and_report_only():
+    test = within_latency_budget(sleep_ms, {95: 0.1}, tolerance=1000)
+    test(1)
+    results = []
+    test = within_latency_budget(
+        sleep_ms, {95: 0.1}, report_only=True, record=results.append
+    )
+    test(1)
+    assert results[0]["over"] == [95]
+
+
+@pytest.mark.latency(p50_ms=50, p95_ms=100)
+def test_latency_within_budget():
+    sorted(range(1000))
@@ -0,0 +1,83 @@
+import tracemalloc
+
+import pytest
+
+from {{ cookiecutter.project_slug }} import _memprofile
+from tests.conftest import within_memory_budget
+
+
+def allocate(args):
+    blocks = [bytearray(1000) for _ in range(1000)]
+    return len(blocks) - 1000
+
+
+def test_parse_size():
+    assert _memprofile.parse_size("200MB") == 200 * 10 ** 6
+    assert _memprofile.parse_size("1.5 KiB") == 1536
+    assert _memprofile.parse_size("10") == 10
+    assert _memprofile.parse_size(64) == 64
+    for size in ("MB", "2 parsecs", "-1MB"):
+        with pytest.raises(ValueError):
+            _memprofile.parse_size(size)
+
+
+def test_format_size():
+    assert _memprofile.format_size(512) == "512 B"
+    assert _memprofile.format_size(3 * 2 ** 20) == "3.0 MiB"
+    assert _memprofile.format_size(-2048) == "-2.0 KiB"
+
+
+def test_memprofile_report():
+    if tracemalloc.is_tracing():
+        # The snapshot would hold every trace of the run, whose report
+        # takes minutes
+        pytest.skip("already under 'invoke memprofile'")
+    code, snapshot, peak = _memprofile.memprofile(allocate, [])
+    assert code == 0
+    assert peak >= 1000 * 1000
+    assert not tracemalloc.is_tracing()
+    text = _memprofile.report(snapshot, peak, previous=snapshot, top=3)
+    assert text.startswith("Peak traced memory: ")
+    assert "by traceback" in text
+    assert "differences with the previous run" in text
+
+
+def test_memprofile_peak_across_resets():
+    def allocate_then_measure(args):
+        allocate(args)
+        # A test marked max_memory resets the peak
+        within_memory_budget(len, _memprofile.parse_size("1MB"))(args)
+        return 0
+
+    code, snapshot, peak = _memprofile.memprofile(allocate_then_measure, [])
+    assert peak >= 1000 * 1000
+
+
+def test_profile_name():
+    assert _memprofile.profile_name(["hello", "--name", "x"]) == "hello"
+    assert _memprofile.profile_name([]) == "main"
+    names = {
+        _memprofile.profile_name(args, pytest=True)
+        for args in ([], ["tests"], ["tests", "-k", "x"], ["tests -k", "x"])
+    }
+    assert len(names) == 4
+    assert all(name.startswith("pytest") for name in names)
+
+
+@pytest.mark.max_memory("10MB")
+def test_max_memory_within_budget():
+    allocate([])
+
+
+def test_max_memory_over_budget():
+    test = within_memory_budget(allocate, _memprofile.parse_size("100KB"))
+    with pytest.raises(pytest.fail.Exception, match="over the budget"):
+        test([])
+
+
+def test_max_memory_under_memprofile_before_python_39(monkeypatch):
+    monkeypatch.delattr(tracemalloc, "reset_peak")
+    test = within_memory_budget(allocate, _memprofile.parse_size("100KB"))
+    with pytest.warns(UserWarning, match="max_memory not checked"):
+        code, snapshot, peak = _memprofile.memprofile(test, [])
+    assert code == 0
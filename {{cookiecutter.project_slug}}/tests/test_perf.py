@@ -0,0 +1,97 @@
+import atexit
+import importlib
+import io
+import threading
+
+import pytest
+
+from {{ cookiecutter.project_slug }} import _perf
+
+
+@pytest.fixture()
+def perf(monkeypatch):
+    """_perf reloaded enabled, then disabled again"""
+    monkeypatch.setenv(_perf.ENVIRONMENT_VARIABLE, "1")
+    module = importlib.reload(_perf)
+    atexit.unregister(module._dump_at_exit)
+    yield module
+    monkeypatch.delenv(_perf.ENVIRONMENT_VARIABLE)
+    importlib.reload(_perf)
+
+
+@pytest.fixture()
+def disabled_perf(monkeypatch):
+    monkeypatch.delenv(_perf.ENVIRONMENT_VARIABLE, raising=False)
+    return importlib.reload(_perf)
+
+
+def work():
+    return sum(range(100))
+
+
+def test_disabled_costs_nothing(disabled_perf):
+    assert disabled_perf.timed(work) is work
+    assert disabled_perf.timed(name="work")(work) is work
+    assert disabled_perf.timer("a") is disabled_perf.timer("b")
+    with disabled_perf.timer("a"):
+        disabled_perf.count("calls")
+    assert disabled_perf.summary() == {"counters": {}, "timers": {}}
+
+
+def test_timers(perf):
+    timed_work = perf.timed(work)
+    assert timed_work is not work
+    assert timed_work() == work()
+    timed_work()
+    with perf.timer("block"):
+        perf.timed(name="named")(work)()
+
+    timers = perf.summary()["timers"]
+    assert set(timers) == {f"{__name__}.work", "block", "named"}
+    timing = timers[f"{__name__}.work"]
+    assert timing["count"] == 2
+    assert sum(timing["buckets"].values()) == 2
+    assert 0 < timing["max"] <= timing["total"]
+
+
+def test_counters_aggregate_threads(perf):
+    def count():
+        for _ in range(100):
+            perf.count("calls")
+
+    threads = [threading.Thread(target=count) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    perf.count("calls", 10)
+    assert perf.summary()["counters"] == {"calls": 410}
+
+    perf.reset()
+    assert perf.summary()["counters"] == {}
+
+
+def test_histogram_quantiles(perf):
+    timing = perf._Timing()
+    for seconds in [5e-7] * 98 + [0.05, 20.0]:
+        timing.add(seconds)
+    assert timing.quantile(0.5) == 1e-6
+    assert timing.quantile(0.99) == 0.1
+    assert timing.quantile(1.0) is None
+
+
+def test_report(perf):
+    with perf.timer("block"):
+        perf.count("calls")
+    output = io.StringIO()
+    perf.report(output)
+    assert "block" in output.getvalue()
+    assert "calls" in output.getvalue()
+
+
+@pytest.mark.parametrize(
+    "seconds, text",
+    [(2, "2 s"), (0.0015, "1.5 ms"), (3e-8, "30 ns"), (None, "inf")],
+)
+def test_format_time(seconds, text):
+    assert _perf.format_time(seconds) == text
@@ -0,0 +1,38 @@
+import time
+
+from {{ cookiecutter.project_slug }} import _profiling
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_sampler_counts_stacks():
+    with _profiling.Sampler(interval=0.001) as sampler:
+        busy(0.05)
+    assert sampler.stacks
+    function, own, total = sampler.hot_functions()[0]
+    assert function == f"{__name__}:busy"
+    assert 0 < own <= total
+
+
+def test_collapsed_format():
+    sampler = _profiling.Sampler()
+    sampler.stacks[("a:main", "b:work")] = 3
+    sampler.stacks[("a:main",)] = 1
+    assert sampler.collapsed() == "a:main 1\na:main;b:work 3\n"
+    assert sampler.hot_functions() == [("b:work", 3, 3), ("a:main", 1, 4)]
+
+
+def test_profile_modes():
+    code, files = _profiling.profile(
+        lambda args: busy(0.01) or 3, [], mode="deterministic"
+    )
+    assert code == 3
+    assert set(files) == {".prof", ".txt"}
+    assert "busy" in files[".txt"]
+
+    code, files = _profiling.profile(lambda args: 0, [], mode="sampling")
+    assert set(files) == {".collapsed", ".txt"}
@@ -0,0 +1,63 @@
+import argparse
+from types import SimpleNamespace
+
+import pytest
+
+from tests.conftest import balance, parse_shard, select
+
+
+def items(*nodeids):
+    return [SimpleNamespace(nodeid=nodeid) for nodeid in nodeids]
+
+
+def test_parse_shard():
+    assert parse_shard("2/3") == (2, 3)
+    for value in ("0/3", "4/3", "2", "a/b"):
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_shard(value)
+
+
+def test_balance_by_duration():
+    tests = items("a", "b", "c", "d")
+    durations = {"a": 3.0, "b": 1.0, "c": 1.0, "d": 1.0}
+    shards = balance(tests, durations, 2)
+    assert [[item.nodeid for item in shard] for shard in shards] == [
+        ["a"],
+        ["b", "c", "d"],
+    ]
+
+
+def test_balance_keeps_collection_order():
+    tests = items("a", "b", "c", "d")
+    durations = {"a": 1.0, "b": 1.0, "c": 2.0, "d": 2.0}
+    shards = balance(tests, durations, 2)
+    assert [[item.nodeid for item in shard] for shard in shards] == [
+        ["a", "c"],
+        ["b", "d"],
+    ]
+
+
+def test_balance_unknown_durations():
+    tests = items("a", "b", "c", "d")
+    shards = balance(tests, {}, 3)
+    assert sorted(item.nodeid for shard in shards for item in shard) == [
+        "a",
+        "b",
+        "c",
+        "d",
+    ]
+    assert sorted(len(shard) for shard in shards) == [1, 1, 2]
+
+
+def test_select_tests_and_modules():
+    tests = items(
+        "tests/test_a.py::test_one",
+        "tests/test_a.py::test_two",
+        "tests/test_b.py::test_one[compiled]",
+        "tests/test_c.py::test_one",
+    )
+    ids = {"tests/test_a.py::test_two", "tests/test_b.py", "tests/test_d.py"}
+    assert [item.nodeid for item in select(tests, ids)] == [
+        "tests/test_a.py::test_two",
+        "tests/test_b.py::test_one[compiled]",
+    ]
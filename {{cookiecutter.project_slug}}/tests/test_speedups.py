@@ -0,0 +1,97 @@
+import random
+from array import array
+
+import pytest
+
+from {{ cookiecutter.project_slug }} import _speedups_py, speedups
+
+
+def test_implementation_in_use(implementation):
+    assert speedups.IMPLEMENTATION == implementation
+
+
+def test_sum_of_squares():
+    assert speedups.sum_of_squares([]) == 0
+    assert speedups.sum_of_squares([1, 2, 3]) == 14
+    assert speedups.sum_of_squares((0.5, -0.5)) == 0.5
+
+
+def test_sum_of_squares_implementations_agree():
+    _speedups = pytest.importorskip("{{ cookiecutter.project_slug }}._speedups")
+    rng = random.Random(0)
+    values = [rng.uniform(-1e3, 1e3) for _ in range(1000)]
+    expected = _speedups_py.sum_of_squares(values)
+    assert _speedups.sum_of_squares(values) == expected
+
+
+def test_unknown_implementation():
+    with pytest.raises(ValueError):
+        speedups.use("fortran")
+
+
+def test_axpy():
+    x = array("d", [1, 2, 3])
+    y = array("d", [10, 20, 30])
+    assert list(speedups.axpy(2.0, x, y)) == [12, 24, 36]
+
+
+def test_axpy_writes_into_out():
+    x = array("d", [1, 2])
+    out = array("d", [0, 0])
+    assert speedups.axpy(1.0, x, x, out) is out
+    assert list(out) == [2, 4]
+
+
+def test_axpy_on_numpy_arrays():
+    numpy = pytest.importorskip("numpy")
+    x = numpy.arange(5, dtype=numpy.float64)
+    out = numpy.empty_like(x)
+    speedups.axpy(3.0, x, x, out)
+    assert out.tolist() == [0, 4, 8, 12, 16]
+
+
+def test_axpy_length_mismatch():
+    with pytest.raises(ValueError):
+        speedups.axpy(1.0, array("d", [1]), array("d", [1, 2]))
+
+
+def test_axpy_implementations_agree():
+    _speedups = pytest.importorskip("{{ cookiecutter.project_slug }}._speedups")
+    rng = random.Random(0)
+    x = array("d", [rng.uniform(-1e3, 1e3) for _ in range(1000)])
+    y = array("d", [rng.uniform(-1e3, 1e3) for _ in range(1000)])
+    expected = _speedups_py.axpy(0.5, x, y)
+    assert list(_speedups.axpy(0.5, x, y)) == pytest.approx(list(expected))
+{%- if cookiecutter.use_openmp == "y" %}
+
+
+def test_dot():
+    x = array("d", [1, 2, 3])
+    y = array("d", [4, 5, 6])
+    assert speedups.dot(x, y) == 32
+
+
+def test_dot_length_mismatch():
+    with pytest.raises(ValueError):
+        speedups.dot(array("d", [1]), array("d", [1, 2]))
+
+
+def test_dot_implementations_agree():
+    _speedups = pytest.importorskip("{{ cookiecutter.project_slug }}._speedups")
+    rng = random.Random(0)
+    x = array("d", [rng.uniform(-1e3, 1e3) for _ in range(100000)])
+    y = array("d", [rng.uniform(-1e3, 1e3) for _ in range(100000)])
+    # Threads sum in a different order: compare with a tolerance
+    expected = _speedups_py.dot(x, y)
+    assert _speedups.dot(x, y) == pytest.approx(expected)
+
+
+def test_num_threads():
+    default = speedups.get_num_threads()
+    assert default >= 1
+    try:
+        speedups.set_num_threads(2)
+        assert speedups.get_num_threads() == 2
+    finally:
+        speedups.set_num_threads(default)
+{%- endif %}
@@ -0,0 +1,28 @@
+import pytest
+
+from {{ cookiecutter.project_slug }} import stats
+
+
+def test_mean():
+    assert stats.mean([1.0, 2.0, 6.0]) == 3.0
+
+
+def test_mean_of_no_values():
+    with pytest.raises(ValueError):
+        stats.mean([])
+
+
+def test_variance():
+    assert stats.variance([1.0, 3.0]) == 1.0
+    assert stats.variance((2.0, 2.0, 2.0)) == 0.0
+
+
+def test_moving_average():
+    values = [1.0, 2.0, 3.0, 4.0]
+    assert stats.moving_average(values, 2) == [1.5, 2.5, 3.5]
+    assert stats.moving_average(values, 5) == []
+
+
+def test_moving_average_window():
+    with pytest.raises(ValueError):
+        stats.moving_average([1.0], 0)
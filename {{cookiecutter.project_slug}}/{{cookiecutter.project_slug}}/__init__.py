@@ -1 +1,62 @@
-from ._about import __version__
\ No newline at end of file
+{%- if cookiecutter.use_lazy_imports == "y" -%}
+"""
+Submodules are imported on first access of their exported names (PEP 562),
+so that importing the package stays cheap. Declare each public name in
+_EXPORTS as "submodule" (the submodule itself) or "submodule:attribute", and
+mirror it in the TYPE_CHECKING block for static type checkers.
+"""
+import importlib
+import sys
+
+from ._about import __version__
+
+# Recognised by name by type checkers, without importing typing at runtime
+TYPE_CHECKING = False
+
+_EXPORTS = {
+    "{{ cookiecutter.project_slug }}": "{{ cookiecutter.project_slug }}",
+{%- if cookiecutter.compiler_backend == "cython" %}
+    "speedups": "speedups",
+{%- elif cookiecutter.compiler_backend == "mypyc" %}
+    "stats": "stats",
+{%- endif %}
+}
+
+__all__ = ["__version__", *_EXPORTS]
+
+if TYPE_CHECKING:
+    from . import {{ cookiecutter.project_slug }}
+{%- if cookiecutter.compiler_backend == "cython" %}
+    from . import speedups
+{%- elif cookiecutter.compiler_backend == "mypyc" %}
+    from . import stats
+{%- endif %}
+
+
+def __getattr__(name):
+    try:
+        target = _EXPORTS[name]
+    except KeyError:
+        raise AttributeError(
+            f"module {__name__!r} has no attribute {name!r}"
+        ) from None
+    module_name, _, attribute = target.partition(":")
+    value = importlib.import_module(f".{module_name}", __name__)
+    if attribute:
+        value = getattr(value, attribute)
+    # Later accesses do not go through __getattr__ anymore
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
+
+
+if sys.version_info < (3, 7):
+    # Module __getattr__ was added in 3.7
+    for _name in _EXPORTS:
+        __getattr__(_name)
+{%- else -%}
+from ._about import __version__
+{%- endif %}
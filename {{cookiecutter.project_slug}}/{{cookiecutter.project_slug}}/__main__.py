@@ -1,17 +1,125 @@
-if __name__ == "__main__":
-    import sys
+import sys
+import time
 
-    import typer
+from {{ cookiecutter.project_slug }}._commands import command_index, complete, load_command
+
+USAGE = "Usage: python -m {{ cookiecutter.project_slug }} [--timings] [--profile=PATH] COMMAND [ARGS]"
+
+
+def _fail(*messages):
     from wasabi import msg
 
-    commands = {}
-
-    if len(sys.argv) == 1:
-        msg.info("Available commands", ", ".join(commands), exits=1)
-    command = sys.argv.pop(1)
-    sys.argv[0] = "{{ cookiecutter.project_slug }} %s" % command
-    if command in commands:
-        typer.run(commands[command])
-    else:
-        available = "Available: {}".format(", ".join(commands))
-        msg.fail("Unknown command: {}".format(command), available, exits=1)
+    msg.fail(*messages, exits=1)
+
+
+def _global_flags(args):
+    """
+    Pop the global flags before the command name from args, returning
+    whether to print timings and the path of the profile to write
+    """
+    timings = False
+    profile = None
+    while args and args[0].startswith("--") and args[0] != "--complete":
+        flag, _, value = args.pop(0).partition("=")
+        if flag == "--timings" and not value:
+            timings = True
+        elif flag == "--profile" and (value or args):
+            profile = value or args.pop(0)
+        else:
+            _fail("Unknown option: {}".format(flag), USAGE)
+    return timings, profile
+
+
+def _peak_rss():
+    """Return the peak resident set size in bytes, None where unknown"""
+    try:
+        import resource
+    except ImportError:
+        # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _instrument(function, profile=None):
+    """
+    Wrap a command to time, and profile into the profile path, its body
+    only: not the parsing of its arguments. Its wall and CPU times are
+    recorded in the returned dict
+    """
+    import functools
+
+    measures = {}
+
+    @functools.wraps(function)
+    def body(*args, **kwargs):
+        if profile is not None:
+            from {{ cookiecutter.project_slug }}._profiling import profiling_to
+
+            with profiling_to(profile):
+                return timed(*args, **kwargs)
+        return timed(*args, **kwargs)
+
+    def timed(*args, **kwargs):
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            measures["wall"] = time.perf_counter() - wall
+            measures["cpu"] = time.process_time() - cpu
+
+    return body, measures
+
+
+def _print_timings(measures):
+    lines = [
+        "{:>8} {:10.1f} ms".format(name, measures[name] * 1000)
+        for name in ("import", "wall", "cpu")
+        if name in measures
+    ]
+    rss = _peak_rss()
+    if rss is not None:
+        lines.append("{:>8} {:10.1f} MiB".format("peak RSS", rss / 2 ** 20))
+    print("\n".join(lines), file=sys.stderr)
+
+
+def main():
+    commands = command_index()
+
+    args = sys.argv[1:]
+    timings, profile = _global_flags(args)
+    if not args:
+        from wasabi import msg
+
+        msg.info("Available commands", ", ".join(sorted(commands)), exits=1)
+    command = args.pop(0)
+    if command == "--complete":
+        prefix = args[0] if args else ""
+        print("\n".join(complete(prefix)))
+        return
+    sys.argv = ["{{ cookiecutter.project_slug }} %s" % command, *args]
+    if command not in commands:
+        available = "Available: {}".format(", ".join(sorted(commands)))
+        _fail("Unknown command: {}".format(command), available)
+    if not (timings or profile):
+        import typer
+
+        typer.run(load_command(commands[command]))
+        return
+
+    start = time.perf_counter()
+    import typer
+
+    function = load_command(commands[command])
+    function, measures = _instrument(function, profile)
+    measures["import"] = time.perf_counter() - start
+    try:
+        typer.run(function)
+    finally:
+        if timings:
+            _print_timings(measures)
+
+
+if __name__ == "__main__":
+    main()
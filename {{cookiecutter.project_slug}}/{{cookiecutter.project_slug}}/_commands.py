@@ -0,0 +1,114 @@
+"""
+Registry of the commands dispatched by ``python -m {{ cookiecutter.project_slug }}``.
+
+Commands are declared by name with the dotted path of their function, either
+in ``COMMANDS`` or through the ``{{ cookiecutter.project_slug }}.commands`` entry point group
+of any installed distribution::
+
+    entry_points={
+        "{{ cookiecutter.project_slug }}.commands": ["hello = {{ cookiecutter.project_slug }}.hello:main"],
+    }
+
+A command module is imported only when that command is dispatched. Entry
+points are indexed once and cached on disk until the installed
+distributions change, so listing commands imports none of them.
+"""
+import importlib
+import json
+import os
+import sys
+import tempfile
+
+COMMANDS = {
+    # "name": "{{ cookiecutter.project_slug }}.module:function",
+}
+ENTRY_POINT_GROUP = "{{ cookiecutter.project_slug }}.commands"
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "{{ cookiecutter.project_slug }}",
+)
+INDEX_FILE = os.path.join(CACHE_DIR, "commands.json")
+# Where pip installs distributions, unlike the script directory or the
+# working directory first on sys.path
+SITE_DIRS = ("site-packages", "dist-packages")
+
+
+def _entry_points():
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        # importlib.metadata added in 3.8
+        try:
+            from importlib_metadata import entry_points
+        except ImportError:
+            return {}
+    eps = entry_points()
+    if hasattr(eps, "select"):
+        group = eps.select(group=ENTRY_POINT_GROUP)
+    else:
+        group = eps.get(ENTRY_POINT_GROUP, [])
+    return {ep.name: ep.value for ep in group}
+
+
+def _fingerprint():
+    """Change whenever a distribution gets installed or removed"""
+    fingerprint = []
+    for path in sys.path[1:]:
+        if os.path.basename(path) not in SITE_DIRS:
+            continue
+        try:
+            fingerprint.append([path, os.stat(path).st_mtime_ns])
+        except OSError:
+            continue
+    return fingerprint
+
+
+def _read_index(fingerprint):
+    try:
+        with open(INDEX_FILE) as file:
+            index = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if index.get("fingerprint") != fingerprint:
+        return None
+    return index["commands"]
+
+
+def _write_index(fingerprint, commands):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Replaced at once: concurrent runs never read a partial index
+        with tempfile.NamedTemporaryFile(
+            "w", dir=CACHE_DIR, suffix=".tmp", delete=False
+        ) as file:
+            json.dump({"fingerprint": fingerprint, "commands": commands}, file)
+        os.replace(file.name, INDEX_FILE)
+    except OSError:
+        # A read-only cache only costs the entry point scan
+        pass
+
+
+def command_index():
+    """Return the command names mapped to their 'module:function' paths"""
+    fingerprint = _fingerprint()
+    commands = _read_index(fingerprint)
+    if commands is None:
+        commands = _entry_points()
+        _write_index(fingerprint, commands)
+    commands = dict(commands)
+    commands.update(COMMANDS)
+    return commands
+
+
+def complete(prefix=""):
+    """Return the sorted command names starting with prefix"""
+    return sorted(name for name in command_index() if name.startswith(prefix))
+
+
+def load_command(target):
+    """Import the module of a 'module:function' path and return the function"""
+    module_name, _, attribute = target.partition(":")
+    command = importlib.import_module(module_name)
+    for name in attribute.split("."):
+        command = getattr(command, name)
+    return command
@@ -0,0 +1,192 @@
+"""
+Memory profiler run by 'invoke memprofile', on a command of
+``python -m {{ cookiecutter.project_slug }}`` or on a pytest selection::
+
+    python -m {{ cookiecutter.project_slug }}._memprofile -- hello --name world
+    python -m {{ cookiecutter.project_slug }}._memprofile --pytest -- tests -k hello
+
+tracemalloc traces the Python allocations of the run. The report has the
+peak of the traced memory, the allocation sites still holding the most
+memory at the end of the run, by line and by traceback, and the difference
+with the snapshot of the previous run of the same command, stored in a
+``.tracemalloc`` file next to the ``.txt`` report.
+"""
+import argparse
+import hashlib
+import linecache
+import os
+import re
+import sys
+import tracemalloc
+
+from {{ cookiecutter.project_slug }}._profiling import _run_command, _run_pytest
+
+UNITS = {
+    "B": 1,
+    "KB": 10 ** 3,
+    "MB": 10 ** 6,
+    "GB": 10 ** 9,
+    "KIB": 2 ** 10,
+    "MIB": 2 ** 20,
+    "GIB": 2 ** 30,
+}
+SIZE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([a-zA-Z]*)\s*$")
+# Allocations of the import machinery and of the profiler
+IGNORED = [
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+]
+# Peak traced before the last reset_peak, part of the peak of the run
+_peak = 0
+
+
+def parse_size(size):
+    """Return the bytes of a number, or of a string like '200MB' or '1 GiB'"""
+    if isinstance(size, (int, float)):
+        return int(size)
+    match = SIZE.match(size)
+    if not match or (match.group(2).upper() or "B") not in UNITS:
+        raise ValueError(f"Invalid size {size!r}, units: {', '.join(UNITS)}")
+    return int(float(match.group(1)) * UNITS[match.group(2).upper() or "B"])
+
+
+def format_size(size):
+    """Format bytes with a binary unit"""
+    for unit in ("GiB", "MiB", "KiB"):
+        scale = UNITS[unit.upper()]
+        if abs(size) >= scale:
+            return f"{size / scale:.1f} {unit}"
+    return f"{size} B"
+
+
+def _site(frame):
+    site = f"{frame.filename}:{frame.lineno}"
+    line = linecache.getline(frame.filename, frame.lineno).strip()
+    return f"{site}\n        {line}" if line else site
+
+
+def report(snapshot, peak, previous=None, top=10):
+    """
+    Format the peak, the top allocation sites of snapshot by line and by
+    traceback, and its difference with a previous snapshot
+    """
+    snapshot = snapshot.filter_traces(IGNORED)
+    current = sum(stat.size for stat in snapshot.statistics("filename"))
+    lines = [f"Peak traced memory: {format_size(peak)}"]
+    lines.append(f"Traced memory at the end: {format_size(current)}")
+
+    lines.append(f"\nTop {top} allocation sites by line:")
+    for stat in snapshot.statistics("lineno")[:top]:
+        lines.append(
+            f"{format_size(stat.size):>12} {stat.count:>8}"
+            f" blocks  {_site(stat.traceback[0])}"
+        )
+
+    lines.append(f"\nTop {top} allocation sites by traceback:")
+    for stat in snapshot.statistics("traceback")[:top]:
+        lines.append(f"{format_size(stat.size):>12} {stat.count:>8} blocks")
+        # Most recent call last
+        for frame in reversed(stat.traceback):
+            lines.append(f"    {_site(frame)}")
+
+    if previous is not None:
+        previous = previous.filter_traces(IGNORED)
+        lines.append(f"\nTop {top} differences with the previous run:")
+        for stat in snapshot.compare_to(previous, "lineno")[:top]:
+            lines.append(
+                f"{format_size(stat.size_diff):>12} {stat.count_diff:>+8}"
+                f" blocks  {_site(stat.traceback[0])}"
+            )
+    return "\n".join(lines) + "\n"
+
+
+def reset_peak():
+    """
+    Reset the peak of tracemalloc, e.g. to measure a single test, keeping
+    the peak so far for get_peak. Return False without tracemalloc.reset_peak
+    (Python < 3.9): restarting the tracing would lose the traces of the run
+    """
+    global _peak
+    if not hasattr(tracemalloc, "reset_peak"):
+        return False
+    _peak = max(_peak, tracemalloc.get_traced_memory()[1])
+    tracemalloc.reset_peak()
+    return True
+
+
+def get_peak():
+    """Return the peak traced memory since tracing started, across resets"""
+    return max(_peak, tracemalloc.get_traced_memory()[1])
+
+
+def profile_name(args, pytest=False):
+    """
+    Name the files of a run after its command, or after the whole arguments
+    of a pytest selection: each one compares with its own previous run
+    """
+    if not pytest:
+        return (args or ["main"])[0].lstrip("-")
+    words = re.sub(r"[^\w.]+", "-", " ".join(args)).strip("-")[:40]
+    digest = hashlib.sha1("\0".join(args).encode()).hexdigest()[:8]
+    return "-".join(filter(None, ["pytest", words, digest]))
+
+
+def memprofile(target, args, frames=10):
+    """
+    Run target(args) under tracemalloc keeping frames frames of traceback,
+    returning its exit code, the snapshot at the end and the peak. Already
+    tracing, tracemalloc goes on with its own number of frames
+    """
+    global _peak
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        _peak = 0
+        tracemalloc.start(frames)
+    try:
+        code = target(args)
+        snapshot = tracemalloc.take_snapshot()
+        peak = get_peak()
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+    return code, snapshot, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m {{ cookiecutter.project_slug }}._memprofile",
+        description="Trace the allocations of a command, or a pytest selection",
+    )
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--frames", type=int, default=10)
+    parser.add_argument("--output", default=".profiles")
+    parser.add_argument("--pytest", action="store_true")
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    options = parser.parse_args()
+    args = options.args[1:] if options.args[:1] == ["--"] else options.args
+
+    target = _run_pytest if options.pytest else _run_command
+    code, snapshot, peak = memprofile(target, args, options.frames)
+    name = profile_name(args, options.pytest)
+    os.makedirs(options.output, exist_ok=True)
+    path = os.path.join(options.output, f"{name}.memory")
+    previous = None
+    if os.path.exists(path + ".tracemalloc"):
+        previous = tracemalloc.Snapshot.load(path + ".tracemalloc")
+    text = report(snapshot, peak, previous, options.top)
+    snapshot.dump(path + ".tracemalloc")
+    with open(path + ".txt", "w") as file:
+        file.write(text)
+    print(f"Wrote {path}.txt and {path}.tracemalloc")
+    print(text)
+    return code
+
+
+if __name__ == "__main__":
+    # The module the tests import, whose peak they reset, not __main__
+    from {{ cookiecutter.project_slug }}._memprofile import main
+
+    sys.exit(main())
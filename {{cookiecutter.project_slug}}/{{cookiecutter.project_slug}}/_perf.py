@@ -0,0 +1,238 @@
+"""
+Instrumentation of hot paths with timers, counters and latency histograms,
+enabled by the {{ cookiecutter.project_slug.upper() }}_PERF environment variable::
+
+    from {{ cookiecutter.project_slug }} import _perf
+
+    @_perf.timed
+    def parse(text):
+        ...
+
+    with _perf.timer("load"):
+        _perf.count("cache.miss")
+
+Disabled (unset or "0", the default), the instrumentation costs nothing:
+timed returns the decorated function itself, timer a shared no-op context
+manager and count returns at once. Enabled, every thread aggregates into its
+own recorder, without locks; summary() merges them. At exit, the summary is
+printed to stderr with {{ cookiecutter.project_slug.upper() }}_PERF=1, or written as JSON to the file
+{{ cookiecutter.project_slug.upper() }}_PERF names otherwise. report() prints it on demand.
+"""
+import atexit
+import bisect
+import os
+import sys
+import threading
+import time
+
+ENVIRONMENT_VARIABLE = "{{ cookiecutter.project_slug.upper() }}_PERF"
+OUTPUT = os.environ.get(ENVIRONMENT_VARIABLE, "0")
+ENABLED = OUTPUT != "0" and OUTPUT != ""
+# Upper bounds of the latency histogram buckets in seconds, the last bucket
+# counting the longer ones
+BUCKETS = (1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0, 10.0)
+
+_local = threading.local()
+_recorders = []
+
+
+class _Timing:
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+
+    def quantile(self, fraction):
+        """Return the upper bound of the bucket of a quantile, None if +inf"""
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+
+class _Recorder:
+    """The counters and timings of one thread"""
+
+    def __init__(self):
+        self.counters = {}
+        self.timings = {}
+
+    def record(self, name, seconds):
+        timing = self.timings.get(name)
+        if timing is None:
+            timing = self.timings[name] = _Timing()
+        timing.add(seconds)
+
+
+def _recorder():
+    try:
+        return _local.recorder
+    except AttributeError:
+        recorder = _local.recorder = _Recorder()
+        # Only once per thread; list.append is atomic
+        _recorders.append(recorder)
+        return recorder
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        _recorder().record(self.name, time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(name):
+    """Return a context manager timing its block under name"""
+    if not ENABLED:
+        return _NULL_TIMER
+    return _Timer(name)
+
+
+def timed(function=None, name=None):
+    """
+    Decorate a function to time its calls, under its qualified name or
+    under name: @timed or @timed(name="parse")
+    """
+    if function is None:
+        return lambda function: timed(function, name)
+    if not ENABLED:
+        return function
+    import functools
+
+    name = name or f"{function.__module__}.{function.__qualname__}"
+    perf_counter = time.perf_counter
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _recorder().record(name, perf_counter() - start)
+
+    return wrapper
+
+
+def count(name, n=1):
+    """Add n to the counter name"""
+    if not ENABLED:
+        return
+    counters = _recorder().counters
+    counters[name] = counters.get(name, 0) + n
+
+
+def summary():
+    """Merge the counters and timings of every thread"""
+    counters = {}
+    timings = {}
+    for recorder in list(_recorders):
+        for name, value in list(recorder.counters.items()):
+            counters[name] = counters.get(name, 0) + value
+        for name, timing in list(recorder.timings.items()):
+            timings.setdefault(name, _Timing()).merge(timing)
+    return {
+        "counters": dict(sorted(counters.items())),
+        "timers": {
+            name: {
+                "count": timing.count,
+                "total": timing.total,
+                "mean": timing.total / timing.count,
+                "max": timing.max,
+                "p50": timing.quantile(0.5),
+                "p99": timing.quantile(0.99),
+                "buckets": dict(
+                    zip([str(b) for b in BUCKETS] + ["inf"], timing.buckets)
+                ),
+            }
+            for name, timing in sorted(timings.items())
+        },
+    }
+
+
+def reset():
+    """Forget what every thread recorded"""
+    for recorder in list(_recorders):
+        recorder.counters.clear()
+        recorder.timings.clear()
+
+
+def format_time(seconds):
+    """Format seconds with a unit, None as inf"""
+    if seconds is None:
+        return "inf"
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g} {unit}"
+    return f"{seconds / 1e-9:.3g} ns"
+
+
+def report(file=None):
+    """Print the summary, quantiles being bucket upper bounds"""
+    file = file or sys.stderr
+    data = summary()
+    columns = ("count", "total", "mean", "max", "p50 <=", "p99 <=")
+    print(f"{'timer':40} " + " ".join(f"{c:>10}" for c in columns), file=file)
+    for name, timing in data["timers"].items():
+        times = [
+            format_time(timing[key])
+            for key in ("total", "mean", "max", "p50", "p99")
+        ]
+        cells = [str(timing["count"])] + times
+        print(f"{name:40} " + " ".join(f"{c:>10}" for c in cells), file=file)
+    if data["counters"]:
+        print(f"{'counter':40} {'count':>10}", file=file)
+    for name, value in data["counters"].items():
+        print(f"{name:40} {value:>10}", file=file)
+
+
+def _dump_at_exit():
+    if OUTPUT == "1":
+        report()
+    else:
+        import json
+
+        with open(OUTPUT, "w") as file:
+            json.dump(summary(), file, indent=1)
+
+
+if ENABLED:
+    atexit.register(_dump_at_exit)
@@ -0,0 +1,223 @@
+"""
+Profilers run by 'invoke profile', on a command of
+``python -m {{ cookiecutter.project_slug }}`` or on a pytest selection::
+
+    python -m {{ cookiecutter.project_slug }}._profiling --mode sampling -- hello --name world
+    python -m {{ cookiecutter.project_slug }}._profiling --pytest -- tests -k hello
+
+The deterministic mode records every call with cProfile: its ``.prof`` file
+opens in pstats or snakeviz. The sampling mode records the stack of the main
+thread at a fixed interval, with little overhead: its ``.collapsed`` file has
+one ``frame;frame;frame count`` line per distinct stack, the input of
+flamegraph.pl, inferno or speedscope. Both modes write a ``.txt`` table of the
+hot functions.
+"""
+import argparse
+import collections
+import contextlib
+import io
+import os
+import sys
+import threading
+
+MODES = ("deterministic", "sampling")
+
+
+def frame_label(frame):
+    """Name a frame by module and function, without ';' (collapsed format)"""
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", "?")
+    # co_qualname added in 3.11
+    function = getattr(code, "co_qualname", code.co_name)
+    return f"{module}:{function}".replace(";", ":")
+
+
+class Sampler:
+    """
+    Count the stacks of a thread, the current one by default, sampled every
+    interval seconds by a background thread while in the with block
+    """
+
+    def __init__(self, interval=0.001, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = collections.Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._switch_interval = None
+
+    def _sample(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            # Up to the profiler frames, the same in every sample
+            while frame is not None and frame.f_globals is not globals():
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def __enter__(self):
+        # The sampler only runs when the profiled thread releases the GIL,
+        # every switch interval (5 ms by default)
+        self._switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self.interval, self._switch_interval))
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+        sys.setswitchinterval(self._switch_interval)
+
+    def collapsed(self):
+        """Return the stacks in the collapsed format of flamegraph tools"""
+        return "".join(
+            f"{';'.join(stack)} {count}\n"
+            for stack, count in sorted(self.stacks.items())
+        )
+
+    def hot_functions(self):
+        """
+        Return (function, self samples, total samples) tuples, the functions
+        the most often on top of the stack first
+        """
+        own = collections.Counter()
+        total = collections.Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for function in set(stack):
+                total[function] += count
+        return sorted(
+            ((function, own[function], total[function]) for function in total),
+            key=lambda row: (-row[1], -row[2], row[0]),
+        )
+
+    def table(self, top=20):
+        """Format the hot functions with their share of the samples"""
+        samples = sum(self.stacks.values()) or 1
+        lines = [f"{samples} samples every {self.interval * 1000:g} ms"]
+        lines.append(f"{'self %':>8} {'total %':>8}  function")
+        for function, own, total in self.hot_functions()[:top]:
+            lines.append(
+                f"{100 * own / samples:8.1f} {100 * total / samples:8.1f}"
+                f"  {function}"
+            )
+        return "\n".join(lines) + "\n"
+
+
+def stats_table(profiler, top=20):
+    """Format the hot functions of a cProfile run, by own then total time"""
+    import pstats
+
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream).strip_dirs()
+    stats.sort_stats("tottime").print_stats(top)
+    stats.sort_stats("cumulative").print_stats(top)
+    return stream.getvalue()
+
+
+@contextlib.contextmanager
+def profiling_to(path, interval=0.001):
+    """
+    Profile the with block into path: sampled stacks in the collapsed
+    format for a .collapsed path, a cProfile .prof file otherwise
+    """
+    if path.endswith(".collapsed"):
+        sampler = Sampler(interval)
+        try:
+            with sampler:
+                yield
+        finally:
+            with open(path, "w") as file:
+                file.write(sampler.collapsed())
+    else:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+
+
+def _run_command(args):
+    """Run a command of 'python -m {{ cookiecutter.project_slug }}', returning its exit code"""
+    from {{ cookiecutter.project_slug }}.__main__ import main
+
+    sys.argv = ["{{ cookiecutter.project_slug }}", *args]
+    try:
+        main()
+    except SystemExit as error:
+        return error.code or 0
+    return 0
+
+
+def _run_pytest(args):
+    import pytest
+
+    return int(pytest.main(list(args)))
+
+
+def profile(target, args, mode="sampling", interval=0.001, top=20):
+    """
+    Run target(args) under the profiler of mode, returning its exit code
+    and the files to write as a {suffix: content} dict
+    """
+    if mode == "deterministic":
+        import cProfile
+        import marshal
+
+        profiler = cProfile.Profile()
+        code = profiler.runcall(target, args)
+        profiler.create_stats()
+        files = {
+            # As Profile.dump_stats writes them
+            ".prof": marshal.dumps(profiler.stats),
+            ".txt": stats_table(profiler, top),
+        }
+    elif mode == "sampling":
+        with Sampler(interval) as sampler:
+            code = target(args)
+        files = {
+            ".collapsed": sampler.collapsed(),
+            ".txt": sampler.table(top),
+        }
+    else:
+        raise ValueError(f"Unknown mode {mode!r}, use one of {MODES}")
+    return code, files
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m {{ cookiecutter.project_slug }}._profiling",
+        description="Profile a command, or a pytest selection",
+    )
+    parser.add_argument("--mode", choices=MODES, default="sampling")
+    parser.add_argument("--interval", type=float, default=0.001)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--output", default=".profiles")
+    parser.add_argument("--pytest", action="store_true")
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    options = parser.parse_args()
+    args = options.args[1:] if options.args[:1] == ["--"] else options.args
+
+    target = _run_pytest if options.pytest else _run_command
+    code, files = profile(
+        target, args, options.mode, options.interval, options.top
+    )
+    name = "pytest" if options.pytest else (args or ["main"])[0].lstrip("-")
+    os.makedirs(options.output, exist_ok=True)
+    for suffix, content in files.items():
+        path = os.path.join(options.output, f"{name}.{options.mode}{suffix}")
+        with open(path, "wb" if isinstance(content, bytes) else "w") as file:
+            file.write(content)
+        print(f"Wrote {path}")
+    print(files[".txt"])
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
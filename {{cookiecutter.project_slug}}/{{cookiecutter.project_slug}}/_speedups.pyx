@@ -0,0 +1,74 @@
+"""Compiled implementation of the functions of _speedups_py"""
+cimport cython
+from cpython cimport array
+{%- if cookiecutter.use_openmp == "y" %}
+from cython.parallel cimport prange
+
+cimport openmp
+{%- endif %}
+
+import array
+
+
+def sum_of_squares(values):
+    """Return the sum of the squares of a sequence of numbers"""
+    cdef double total = 0.0
+    cdef double value
+    for value in values:
+        total += value * value
+    return total
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def axpy(double alpha, const double[::1] x, const double[::1] y, out=None):
+    """
+    Compute alpha * x + y element-wise over buffers of doubles (e.g.
+    array.array("d") or float64 NumPy arrays), writing into out when given
+    and into a new array.array("d") otherwise. Return the output buffer
+
+    Inputs and output are accessed in place through typed memoryviews, and
+    the loop runs without the GIL.
+    """
+    cdef Py_ssize_t i
+    cdef Py_ssize_t n = x.shape[0]
+    if y.shape[0] != n:
+        raise ValueError("x and y must have the same length")
+    if out is None:
+        out = array.clone(array.array("d"), n, zero=False)
+    cdef double[::1] result = out
+    if result.shape[0] != n:
+        raise ValueError("out must have the same length as x")
+    with nogil:
+        for i in range(n):
+            result[i] = alpha * x[i] + y[i]
+    return out
+{%- if cookiecutter.use_openmp == "y" %}
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def dot(const double[::1] x, const double[::1] y):
+    """
+    Return the dot product of two buffers of doubles, summed in parallel by
+    the OpenMP threads
+    """
+    cdef Py_ssize_t i
+    cdef Py_ssize_t n = x.shape[0]
+    cdef double total = 0.0
+    if y.shape[0] != n:
+        raise ValueError("x and y must have the same length")
+    for i in prange(n, nogil=True, schedule="static"):
+        total += x[i] * y[i]
+    return total
+
+
+def get_num_threads():
+    """Return the number of OpenMP threads, OMP_NUM_THREADS by default"""
+    return openmp.omp_get_max_threads()
+
+
+def set_num_threads(int num_threads):
+    """Set the number of OpenMP threads running the parallel kernels"""
+    openmp.omp_set_num_threads(num_threads)
+{%- endif %}
@@ -0,0 +1,77 @@
+"""
+Pure-Python reference implementation of the accelerated functions.
+
+_speedups.pyx must implement the same __all__, with the same results: the
+test suite runs against both implementations.
+"""
+{% if cookiecutter.use_openmp == "y" -%}
+import os
+{% endif -%}
+from array import array
+
+{% if cookiecutter.use_openmp == "y" -%}
+__all__ = [
+    "axpy",
+    "dot",
+    "get_num_threads",
+    "set_num_threads",
+    "sum_of_squares",
+]
+
+_num_threads = None
+{%- else -%}
+__all__ = ["axpy", "sum_of_squares"]
+{%- endif %}
+
+
+def sum_of_squares(values):
+    """Return the sum of the squares of a sequence of numbers"""
+    total = 0.0
+    for value in values:
+        total += value * value
+    return total
+
+
+def axpy(alpha, x, y, out=None):
+    """
+    Compute alpha * x + y element-wise over buffers of doubles (e.g.
+    array.array("d") or float64 NumPy arrays), writing into out when given
+    and into a new array.array("d") otherwise. Return the output buffer
+    """
+    n = len(x)
+    if len(y) != n:
+        raise ValueError("x and y must have the same length")
+    if out is None:
+        out = array("d", bytes(8 * n))
+    elif len(out) != n:
+        raise ValueError("out must have the same length as x")
+    for i in range(n):
+        out[i] = alpha * x[i] + y[i]
+    return out
+{%- if cookiecutter.use_openmp == "y" %}
+
+
+def dot(x, y):
+    """Return the dot product of two buffers of doubles"""
+    if len(x) != len(y):
+        raise ValueError("x and y must have the same length")
+    total = 0.0
+    for i in range(len(x)):
+        total += x[i] * y[i]
+    return total
+
+
+def get_num_threads():
+    """Return the number of threads, OMP_NUM_THREADS by default"""
+    if _num_threads is not None:
+        return _num_threads
+    # OMP_NUM_THREADS may list the threads of each nesting level
+    value = os.environ.get("OMP_NUM_THREADS", "").split(",")[0].strip()
+    return int(value) if value.isdigit() else os.cpu_count()
+
+
+def set_num_threads(num_threads):
+    """Set the number of threads (this implementation runs serially)"""
+    global _num_threads
+    _num_threads = num_threads
+{%- endif %}
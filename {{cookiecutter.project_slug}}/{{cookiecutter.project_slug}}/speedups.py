@@ -0,0 +1,45 @@
+"""
+Accelerated functions, from the compiled _speedups extension when it is
+built and from the pure-Python _speedups_py reference otherwise.
+
+Set the {{ cookiecutter.project_slug.upper() }}_SPEEDUPS environment variable to "compiled" or
+"python" to force either implementation. Access the functions through this
+module, e.g. speedups.sum_of_squares, so that use() can switch them.
+"""
+import os
+
+from . import _speedups_py
+from ._speedups_py import *  # noqa: F401,F403 (the API type checkers see)
+
+ENVIRONMENT_VARIABLE = "{{ cookiecutter.project_slug.upper() }}_SPEEDUPS"
+IMPLEMENTATIONS = ("compiled", "python")
+
+
+def _load(implementation):
+    if implementation == "python":
+        return _speedups_py
+    try:
+        from . import _speedups
+    except ImportError:
+        if implementation == "compiled":
+            raise
+        return _speedups_py
+    return _speedups
+
+
+def use(implementation=None):
+    """
+    Bind the public functions to an implementation: "compiled", "python",
+    or None for the compiled one when available
+    """
+    global IMPLEMENTATION
+    if implementation not in (None,) + IMPLEMENTATIONS:
+        raise ValueError(f"Unknown implementation: {implementation!r}")
+    module = _load(implementation)
+    for name in _speedups_py.__all__:
+        globals()[name] = getattr(module, name)
+    IMPLEMENTATION = "python" if module is _speedups_py else "compiled"
+    return IMPLEMENTATION
+
+
+IMPLEMENTATION = use(os.environ.get(ENVIRONMENT_VARIABLE) or None)
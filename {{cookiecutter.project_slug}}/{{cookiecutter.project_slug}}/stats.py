@@ -0,0 +1,41 @@
+"""
+Statistics over sequences of floats, in plain annotated Python that
+'invoke build' compiles with mypyc (see the [mypyc] section of setup.cfg).
+Unbuilt, the module runs interpreted with the same results.
+"""
+from typing import List, Sequence
+
+
+def mean(values: Sequence[float]) -> float:
+    """Return the arithmetic mean of non-empty values"""
+    if not values:
+        raise ValueError("mean of no values")
+    total = 0.0
+    for value in values:
+        total += value
+    return total / len(values)
+
+
+def variance(values: Sequence[float]) -> float:
+    """Return the population variance of non-empty values"""
+    center = mean(values)
+    total = 0.0
+    for value in values:
+        deviation = value - center
+        total += deviation * deviation
+    return total / len(values)
+
+
+def moving_average(values: Sequence[float], window: int) -> List[float]:
+    """Return the means of every window of consecutive values"""
+    if window < 1:
+        raise ValueError("window must be positive")
+    averages: List[float] = []
+    total = 0.0
+    for i, value in enumerate(values):
+        total += value
+        if i >= window:
+            total -= values[i - window]
+        if i >= window - 1:
+            averages.append(total / window)
+    return averages